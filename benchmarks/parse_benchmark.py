@@ -0,0 +1,234 @@
+"""Parse Benchmark - Success rate and throughput of the quest parser on a corpus of model outputs
+
+    python -m benchmarks.parse_benchmark [--repeat 200]
+    python -m benchmarks.parse_benchmark --rebuild    # regenerate benchmarks/quest_corpus.jsonl
+
+The corpus holds quest JSON in the shapes the free models return it (fenced, chatty,
+bare, braces in the surrounding prose) plus copies with the defects we see in
+production: trailing commas, raw newlines and unescaped quotes inside strings, curly
+quotes, Python literals and truncated output. Truncated entries should fail - the
+parser must not invent the missing half of a quest.
+
+The "legacy" column is the extraction the generators used before modules/quest_parser.py
+(strip fences, slice first "{" to last "}", json.loads, retry without trailing commas).
+A document legacy can't parse fails fast and never reaches the builders, so per-defect
+times flatter it; "parsed by both" compares the two on the same documents.
+"""
+import re
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from collections import defaultdict
+
+from modules.quest_parser import extract_json, build_quest, build_story, build_quiz, build_master, build_detective
+
+CORPUS_FILE = Path(__file__).parent / "quest_corpus.jsonl"
+
+BUILDERS = {
+    "unified": build_quest,
+    "story": build_story,
+    "quiz": build_quiz,
+    "master": build_master,
+    "detective": build_detective,
+}
+
+# ==================== Parsers Under Test ====================
+
+def legacy_extract(text: str) -> dict:
+    """The pre-quest_parser extraction, kept here as the baseline"""
+    text = text.strip()
+    if "```" in text:
+        text = re.sub(r'```json?\s*', '', text)
+        text = re.sub(r'```', '', text)
+
+    start_idx = text.find('{')
+    end_idx = text.rfind('}')
+    if start_idx != -1 and end_idx != -1:
+        text = text[start_idx:end_idx+1]
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        text = re.sub(r',\s*}', '}', text)
+        text = re.sub(r',\s*]', ']', text)
+        return json.loads(text)
+
+PARSERS = {
+    "legacy": legacy_extract,
+    "quest_parser": extract_json,
+}
+
+def parse(extract, entry: dict):
+    """Run one extractor plus the shared builders - the built content or None"""
+    try:
+        return BUILDERS[entry["shape"]](extract(entry["text"]), "Benchmark Topic")
+    except Exception:
+        return None
+
+# ==================== Corpus ====================
+
+def quest_json(quest: dict) -> dict:
+    """A featured quest in the JSON shape the generation prompts ask for"""
+    story, quiz, master, detective = quest["story"], quest["quiz"], quest["master"], quest["detective"]
+    question, _, options_text = detective.question.partition("\n\n")
+    return {
+        "story": {"title": story.title, "content": story.content, "key_facts": story.key_facts},
+        "quiz": {"questions": [
+            {"question": q.question, "options": q.options, "correct_index": q.correct_index, "explanation": q.explanation}
+            for q in quiz.questions
+        ]},
+        "master": {"questions": [
+            {"question": q.question, "options": q.options, "correct_answer": q.correct_answer, "explanation": q.explanation}
+            for q in master.questions
+        ]},
+        "detective": {
+            "case_title": detective.case_title,
+            "scenario": detective.scenario,
+            "clues": [{"id": c.id, "description": c.description} for c in detective.clues],
+            "question": question,
+            "options": [line[3:] for line in options_text.splitlines() if line[1:3] == ". "],
+            "correct_answer": detective.correct_answer,
+            "explanation": detective.explanation,
+        },
+    }
+
+STYLES = {
+    "fenced": lambda body, topic: f"```json\n{body}\n```",
+    "chatty": lambda body, topic: f"Here is the complete learning experience about {topic}:\n\n```json\n{body}\n```\n\nLet me know if you'd like any changes!",
+    "bare": lambda body, topic: body,
+    "prose_braces": lambda body, topic: f"Sure! I filled in every {{section}} you asked for:\n{body}\nEach {{stage}} builds on the story.",
+}
+
+def perturb(body: str, defect: str, rng: random.Random) -> str:
+    """Inject one kind of model defect into pretty-printed JSON"""
+    if defect == "trailing_commas":
+        return re.sub(r'(["\d\]}])(\n\s*[}\]])', lambda m: m.group(1) + ("," if rng.random() < 0.7 else "") + m.group(2), body)
+    if defect == "raw_newlines":
+        return body.replace("\\n", "\n")
+    if defect == "inner_quotes":
+        return re.sub(r'(: "[^"\\]{20,}?) (\w{4,}) ', lambda m: f'{m.group(1)} "{m.group(2)}" ', body, count=3)
+    if defect == "smart_quotes":
+        return re.sub(r'"(\w+)":', "“\\1”:", body)
+    if defect == "python_literals":
+        return re.sub(r'("id": \d+)', '\\1, "is_key_clue": True, "hint": None', body)
+    if defect == "truncated":
+        return body[:int(len(body) * rng.uniform(0.5, 0.95))]
+    return body
+
+DEFECTS = ["none", "trailing_commas", "raw_newlines", "inner_quotes", "smart_quotes", "python_literals", "truncated"]
+
+def rebuild_corpus(seed: int = 7) -> list[dict]:
+    """Regenerate the corpus from the featured quests"""
+    from modules.prebuilt_quests import featured_quest_ids, get_featured_quest
+
+    rng = random.Random(seed)
+    entries = []
+    for quest_id in featured_quest_ids():
+        for level in (1, 2, 3):
+            data = quest_json(get_featured_quest(quest_id, level))
+            samples = [("unified", data)] + [(stage, data[stage]) for stage in ("story", "quiz", "master", "detective")]
+            for shape, value in samples:
+                style = rng.choice(list(STYLES))
+                body = json.dumps(value, indent=2, ensure_ascii=False)
+                for defect in DEFECTS:
+                    entries.append({
+                        "id": f"{quest_id}-{level}-{shape}-{defect}",
+                        "shape": shape,
+                        "style": style,
+                        "defect": defect,
+                        "text": STYLES[style](perturb(body, defect, rng), quest_id),
+                    })
+    return entries
+
+def load_corpus(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ==================== Benchmark ====================
+
+def run(entries: list[dict], repeat: int) -> dict:
+    """Success rate, microseconds per document and overall throughput, per parser and defect"""
+    results = {}
+    total_bytes = sum(len(entry["text"].encode()) for entry in entries)
+    for name, extract in PARSERS.items():
+        ok = defaultdict(int)
+        parsed = set()
+        for entry in entries:
+            if parse(extract, entry) is not None:
+                ok[entry["defect"]] += 1
+                parsed.add(entry["id"])
+
+        seconds = defaultdict(float)
+        entry_seconds = defaultdict(float)
+        clock = time.perf_counter
+        for _ in range(repeat):
+            for entry in entries:
+                started = clock()
+                parse(extract, entry)
+                took = clock() - started
+                seconds[entry["defect"]] += took
+                entry_seconds[entry["id"]] += took
+        elapsed = sum(seconds.values())
+
+        results[name] = {
+            "ok": ok,
+            "parsed": parsed,
+            "seconds": seconds,
+            "entry_seconds": entry_seconds,
+            "docs_per_s": len(entries) * repeat / elapsed,
+            "mb_per_s": total_bytes * repeat / elapsed / 1e6,
+        }
+    return results
+
+def report(entries: list[dict], results: dict, repeat: int) -> None:
+    counts = defaultdict(int)
+    for entry in entries:
+        counts[entry["defect"]] += 1
+    defects = [defect for defect in DEFECTS if counts[defect]]
+    names = list(results)
+
+    print(f"{len(entries)} documents, {sum(len(e['text']) for e in entries) / 1e6:.2f} MB, {repeat} timing passes\n")
+    print(f"{'success rate':<18}" + "".join(f"{name:>16}" for name in names))
+    for defect in defects:
+        print(f"{defect:<18}" + "".join(f"{results[n]['ok'][defect] / counts[defect]:>16.0%}" for n in names))
+    recoverable = sum(counts[d] for d in defects if d != "truncated")
+    print(f"{'all but truncated':<18}" + "".join(
+        f"{sum(v for d, v in results[n]['ok'].items() if d != 'truncated') / recoverable:>16.0%}" for n in names
+    ))
+
+    print(f"\n{'us per document':<18}" + "".join(f"{name:>16}" for name in names))
+    for defect in defects:
+        print(f"{defect:<18}" + "".join(
+            f"{results[n]['seconds'][defect] / (counts[defect] * repeat) * 1e6:>16.1f}" for n in names
+        ))
+    both = set.intersection(*(results[n]["parsed"] for n in names))
+    if both:
+        print(f"{'parsed by both':<18}" + "".join(
+            f"{sum(results[n]['entry_seconds'][i] for i in both) / (len(both) * repeat) * 1e6:>16.1f}" for n in names
+        ))
+
+    print()
+    for metric, label in (("docs_per_s", "docs/s"), ("mb_per_s", "MB/s")):
+        print(f"{label:<18}" + "".join(f"{results[n][metric]:>16,.1f}" for n in names))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quest JSON parsing on a corpus of model outputs")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_FILE)
+    parser.add_argument("--repeat", type=int, default=100, help="Passes over the corpus for the timing run")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate the corpus from the featured quests")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        entries = rebuild_corpus()
+        with open(args.corpus, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        print(f"Wrote {len(entries)} entries to {args.corpus}")
+
+    entries = load_corpus(args.corpus)
+    report(entries, run(entries, args.repeat), args.repeat)
+
+if __name__ == "__main__":
+    main()
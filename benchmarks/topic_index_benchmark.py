@@ -0,0 +1,83 @@
+"""Topic Index Benchmark - Lookup latency and match quality of the similar-topic index
+
+    python -m benchmarks.topic_index_benchmark [--topics 100000] [--lookups 2000]
+
+Fills a TopicIndex with synthetic topics, then times lookups of reworded copies
+("how does X work", "Introduction to X", plurals), of near misses (a stored topic
+with one word changed or added, like "nuclear fission" for "nuclear fusion") and
+of topics that aren't stored.
+"""
+import time
+import random
+import argparse
+
+from modules.topic_index import TopicIndex, prepare
+
+SYLLABLES = """ba be bi bo bu da de di do du ka ke ki ko ku la le li lo lu ma me mi mo mu na ne ni no nu
+ra re ri ro ru sa se si so su ta te ti to tu va ve vi vo vu zan ter mon phos syn gen tri cal lor quan""".split()
+
+REWORDINGS = [
+    "how does {} work",
+    "what is {}",
+    "{}",
+    "Introduction to {}",
+    "{}s",
+    "{} explained",
+    "Learn about {}",
+]
+
+def synthetic_topics(count: int, rng: random.Random) -> list[str]:
+    """Distinct 1-3 word topics over a large made-up vocabulary"""
+    vocabulary = list({"".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(count)})
+    topics = set()
+    while len(topics) < count:
+        topics.add(" ".join(rng.sample(vocabulary, rng.randint(1, 3))))
+    return list(topics)
+
+def near_miss(topic: str, rng: random.Random) -> str:
+    """The topic with one word's syllable changed, or a word added - similar text, different topic"""
+    words = topic.split()
+    if len(words) > 1 and rng.random() < 0.5:
+        return f"{topic} {rng.choice(SYLLABLES)}{rng.choice(SYLLABLES)}"
+    index = rng.randrange(len(words))
+    words[index] = rng.choice(SYLLABLES) + words[index][2:] + "x"
+    return " ".join(words)
+
+def percentile(values: list[float], p: float) -> float:
+    return sorted(values)[min(int(len(values) * p), len(values) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the similar-topic index")
+    parser.add_argument("--topics", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    topics = synthetic_topics(args.topics, rng)
+    index = TopicIndex()
+
+    started = time.perf_counter()
+    for topic in topics:
+        key = f"1:{topic}"
+        index.insert(key, *prepare(key))
+    build = time.perf_counter() - started
+    print(f"Indexed {len(index):,} topics in {build:.1f}s ({build / len(index) * 1e6:.0f} us/topic), {len(index.buckets):,} buckets")
+
+    for label, queries, expect_hit in (
+        ("reworded", [rng.choice(REWORDINGS).format(t) for t in rng.sample(topics, args.lookups)], True),
+        ("near miss", [near_miss(t, rng) for t in rng.sample(topics, args.lookups)], False),
+        ("unrelated", [f"unrelated topic {i} zyx" for i in range(args.lookups)], False),
+    ):
+        timings, hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            match = index.lookup(query)
+            timings.append(time.perf_counter() - started)
+            hits += match is not None
+        print(f"{label:<10} hit rate {hits / len(queries):>6.1%}  (expected {'high' if expect_hit else 'zero'})  "
+              f"p50 {percentile(timings, 0.5) * 1e6:.0f} us  p99 {percentile(timings, 0.99) * 1e6:.0f} us  "
+              f"max {max(timings) * 1e6:.0f} us")
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,3 @@
 """Gamification package for V2"""
 from .engine import add_xp, get_stats, unlock_achievement, increment_stat, ACHIEVEMENTS
-from .models import UserProgress, Story, Quiz, QuizQuestion, MasterPractice, MasterQuestion, DetectiveCase, Clue, LearningSession
+from .models import UserProgress, Story, Quiz, QuizQuestion, MasterPractice, MasterQuestion, DetectiveCase, Clue, ContentRef, LearningSession
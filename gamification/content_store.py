@@ -0,0 +1,191 @@
+"""Content Store - Persistent cache of generated quests (shared by all workers via SQLite)"""
+import os
+import re
+import time
+import threading
+from collections import Counter
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+
+from .database import SessionLocal
+from .models_db import GeneratedContent, GenerationLease
+from .models import Story, Quiz, MasterPractice, DetectiveCase
+
+CONTENT_TTL = float(os.getenv("CONTENT_CACHE_TTL", str(7 * 24 * 3600)))   # 7 days
+CONTENT_MAX_ENTRIES = int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "5000"))
+TOUCH_INTERVAL = 60  # Only rewrite last_used on a hit if it is older than this (seconds)
+
+CONTENT_MODELS = {
+    "story": Story,
+    "quiz": Quiz,
+    "master": MasterPractice,
+    "detective": DetectiveCase,
+}
+
+# Matches "Level 2", "(Level 2 - Advanced)", "lvl 3"
+LEVEL_PATTERN = re.compile(r"\(?\b(?:level|lvl)\s*(\d+)\b(?:\s*-\s*\w+)?\)?")
+
+# Symbols that tell topics apart ("C++", "C#" and "C" are different languages), spelled out before punctuation is dropped
+SYMBOL_WORDS = [
+    (re.compile(r"(?<=\w)\+\+"), " plus plus "),
+    (re.compile(r"(?<=\w)\+"), " plus "),
+    (re.compile(r"(?<=\w)#"), " sharp "),
+]
+
+# Hits counted in memory and written with the next last_used touch
+pending_hits = Counter()
+hits_lock = threading.Lock()
+
+def normalize_topic(topic: str) -> tuple[str, int]:
+    """Normalize a topic for cache lookups, return (normalized topic, level)"""
+    text = topic.lower().strip()
+    
+    level = 1
+    level_match = LEVEL_PATTERN.search(text)
+    if level_match:
+        level = int(level_match.group(1))
+        text = LEVEL_PATTERN.sub(" ", text)
+    
+    # Drop punctuation (keeping meaningful symbols as words) and collapse whitespace
+    for pattern, word in SYMBOL_WORDS:
+        text = pattern.sub(word, text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = " ".join(text.split())
+    return text, level
+
+def topic_key(topic: str) -> str:
+    """Cache key for a topic, e.g. "2:photosynthesis" """
+    normalized, level = normalize_topic(topic)
+    return f"{level}:{normalized}"
+
+def get_cached_content(topic: str) -> Optional[dict]:
+    """Return cached {"story", "quiz", "master", "detective"} for a topic, or None"""
+    return get_content_by_key(topic_key(topic))
+
+def get_content_by_key(key: str) -> Optional[dict]:
+    """Return cached content stored under a topic key (see topic_key), or None"""
+    now = time.time()
+    db = SessionLocal()
+    try:
+        row = db.get(GeneratedContent, key)
+        if not row:
+            return None
+        
+        if now - row.created_at > CONTENT_TTL:
+            db.delete(row)
+            db.commit()
+            return None
+        
+        content = {name: model.model_validate(row.content[name]) for name, model in CONTENT_MODELS.items()}
+        
+        # Keep LRU order and the hit count roughly current without a write on every hit
+        with hits_lock:
+            pending_hits[key] += 1
+            touch = now - (row.last_used or 0) > TOUCH_INTERVAL
+            hits = pending_hits.pop(key) if touch else 0
+        if touch:
+            row.hits = (row.hits or 0) + hits
+            row.last_used = now
+            db.commit()
+        return content
+    except Exception as e:
+        print(f"[CONTENT STORE] Read failed for {key}: {type(e).__name__}: {e}")
+        return None
+    finally:
+        db.close()
+
+def save_content(topic: str, content: dict) -> None:
+    """Save generated content for a topic, evicting expired and least recently used entries"""
+    normalized, level = normalize_topic(topic)
+    key = f"{level}:{normalized}"
+    now = time.time()
+    db = SessionLocal()
+    try:
+        row = db.get(GeneratedContent, key)
+        if not row:
+            row = GeneratedContent(topic_key=key, hits=0)
+            db.add(row)
+        row.topic = topic
+        row.level = level
+        row.content = {name: content[name].model_dump() for name in CONTENT_MODELS}
+        row.created_at = now
+        row.last_used = now
+        db.commit()
+        
+        evict_content(db, now)
+    except Exception as e:
+        db.rollback()
+        print(f"[CONTENT STORE] Write failed for {key}: {type(e).__name__}: {e}")
+    finally:
+        db.close()
+
+def list_content_keys(since: float = 0.0) -> list[tuple[str, float]]:
+    """(topic key, created_at) of unexpired entries saved after since, oldest first"""
+    db = SessionLocal()
+    try:
+        return [(key, created_at) for key, created_at in db.query(
+            GeneratedContent.topic_key, GeneratedContent.created_at
+        ).filter(
+            GeneratedContent.created_at > max(since, time.time() - CONTENT_TTL)
+        ).order_by(GeneratedContent.created_at.asc())]
+    finally:
+        db.close()
+
+def evict_content(db, now: float = None) -> int:
+    """Drop expired entries, then the least recently used ones above CONTENT_MAX_ENTRIES"""
+    now = now or time.time()
+    removed = db.query(GeneratedContent).filter(
+        GeneratedContent.created_at < now - CONTENT_TTL
+    ).delete(synchronize_session=False)
+    
+    overflow = db.query(GeneratedContent).count() - CONTENT_MAX_ENTRIES
+    if overflow > 0:
+        oldest = [key for (key,) in db.query(GeneratedContent.topic_key).order_by(
+            GeneratedContent.last_used.asc()
+        ).limit(overflow)]
+        removed += db.query(GeneratedContent).filter(
+            GeneratedContent.topic_key.in_(oldest)
+        ).delete(synchronize_session=False)
+    
+    db.commit()
+    return removed
+
+# ==================== Generation Leases ====================
+
+def acquire_lease(key: str, owner: str, ttl: float) -> bool:
+    """Try to become the one worker generating a topic key"""
+    now = time.time()
+    db = SessionLocal()
+    try:
+        db.add(GenerationLease(topic_key=key, owner=owner, expires_at=now + ttl))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+        
+        # Someone holds it - take it over only if it expired (or is already ours)
+        taken = db.query(GenerationLease).filter(
+            GenerationLease.topic_key == key,
+            (GenerationLease.expires_at < now) | (GenerationLease.owner == owner)
+        ).update({"owner": owner, "expires_at": now + ttl}, synchronize_session=False)
+        db.commit()
+        return taken == 1
+    except Exception as e:
+        db.rollback()
+        print(f"[CONTENT STORE] Lease check failed for {key}: {type(e).__name__}: {e}")
+        return True  # Never block generation on a lease error
+    finally:
+        db.close()
+
+def release_lease(key: str, owner: str) -> None:
+    """Release a lease taken with acquire_lease"""
+    db = SessionLocal()
+    try:
+        db.query(GenerationLease).filter(
+            GenerationLease.topic_key == key,
+            GenerationLease.owner == owner
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
@@ -1,5 +1,6 @@
 """Database connection handling"""
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base
 from pathlib import Path
 
@@ -14,6 +15,14 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers in every worker proceed while one writes; NORMAL sync is safe with WAL"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -25,3 +34,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def add_missing_columns(table: str, columns: dict) -> None:
+    """Add columns (name -> SQL type) that an older database's table doesn't have yet"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table)}
+    for name, kind in columns.items():
+        if name in existing:
+            continue
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {kind}"))
+        except OperationalError:
+            pass  # Another worker added it first
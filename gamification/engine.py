@@ -3,12 +3,20 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 from sqlalchemy.orm import Session
 
-from .database import SessionLocal, engine
-from .models_db import Base, User
+from .database import SessionLocal, engine, add_missing_columns
+from .models_db import Base, User, QuestSession
 from .models import UserProgress
 
-# Create tables if they don't exist
+# Create tables if they don't exist - every table, for the whole app: the gamification
+# package is imported (and this runs) before any module that uses one
 Base.metadata.create_all(bind=engine)
+# Columns added to the sessions table since older databases created it
+add_missing_columns(QuestSession.__tablename__, {
+    "stages_completed": "INTEGER DEFAULT 0",  # session_history
+    "state": "BLOB",                          # session_store
+    "updated_at": "FLOAT",
+    "claimed": "INTEGER",
+})
 
 # Achievement definitions for V2
 ACHIEVEMENTS = {
@@ -81,11 +81,18 @@ class DetectiveCase(BaseModel):
 
 # ==================== Learning Session ====================
 
+class ContentRef(BaseModel):
+    """Shared, read-only quest content a session points at instead of holding a copy"""
+    content_id: str  # e.g. "featured:python"
+    level: int = 1
+    version: int = 1
+
 class LearningSession(BaseModel):
     """Complete learning session state"""
     session_id: str
     topic: str
     current_mode: str  # story, quiz, master, detective
+    content: Optional[ContentRef] = None  # Shared content; the stage fields below are then left empty
     story: Optional[Story] = None
     quiz: Optional[Quiz] = None
     master: Optional[MasterPractice] = None
@@ -95,3 +102,4 @@ class LearningSession(BaseModel):
     master_completed: bool = False
     detective_completed: bool = False
     total_xp_earned: int = 0
+    stages_pending: bool = False  # A worker is still generating quiz/master/detective for the story
@@ -1,5 +1,5 @@
 """SQLAlchemy Database Models"""
-from sqlalchemy import Column, Integer, String, Text, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, JSON, Float, LargeBinary
 from .database import Base
 
 class User(Base):
@@ -29,3 +29,49 @@ class QuestSession(Base):
     created_at = Column(String)  # Timestamp
     completed = Column(Boolean, default=False)
     xp_earned = Column(Integer, default=0)
+    stages_completed = Column(Integer, default=0)  # Story, quiz, master, detective done so far
+    state = Column(LargeBinary, nullable=True)   # Live session (see session_store), cleared when it expires
+    updated_at = Column(Float, nullable=True)    # Unix time state was last saved
+    claimed = Column(Integer, nullable=True)     # Bit per stage whose XP was awarded (see session_store)
+
+class GeneratedContent(Base):
+    """Cache of AI-generated quest content, keyed by normalized topic + level"""
+    __tablename__ = "generated_content"
+    
+    topic_key = Column(String, primary_key=True)  # "<level>:<normalized topic>"
+    topic = Column(String)                        # Topic as first requested
+    level = Column(Integer, default=1)
+    content = Column(JSON)                        # {"story": {...}, "quiz": {...}, "master": {...}, "detective": {...}}
+    created_at = Column(Float)                    # Unix time, used for TTL
+    last_used = Column(Float, index=True)         # Unix time, used for LRU eviction
+    hits = Column(Integer, default=0)
+
+class GenerationLease(Base):
+    """Cross-worker lock: the worker holding a topic's lease is the one generating it"""
+    __tablename__ = "generation_leases"
+    
+    topic_key = Column(String, primary_key=True)
+    owner = Column(String)       # "<hostname>:<pid>" of the generating worker
+    expires_at = Column(Float)   # Unix time, an expired lease can be taken over
+
+class GenerationJob(Base):
+    """Status of a session generation job, so any worker can answer polls for it"""
+    __tablename__ = "generation_jobs"
+    
+    job_id = Column(String, primary_key=True)
+    topic = Column(String)
+    status = Column(String)                       # queued -> running -> done | failed
+    position = Column(Integer, nullable=True)     # Place in the accepting worker's queue
+    progress = Column(String, nullable=True)      # Latest progress message
+    result = Column(JSON, nullable=True)          # The session, once its story is ready
+    message = Column(String, nullable=True)       # Why it failed
+    updated_at = Column(Float, index=True)        # Unix time, finished jobs are pruned after AI_JOB_TTL
+
+class RateLimitBucket(Base):
+    """Token bucket for outbound LLM calls, one per model + API key, shared by all workers"""
+    __tablename__ = "rate_limit_buckets"
+    
+    bucket_key = Column(String, primary_key=True)  # "<model>|<sha256(api key)[:16]>"
+    tokens = Column(Float)                         # Requests available right now
+    updated_at = Column(Float)                     # Unix time tokens was last refilled
+    blocked_until = Column(Float, default=0.0)     # Set from a 429's Retry-After
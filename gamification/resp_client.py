@@ -0,0 +1,99 @@
+"""RESP Client - Minimal asyncio client for Redis-protocol servers (just what the session store needs)"""
+import asyncio
+from typing import Optional
+from urllib.parse import urlparse
+
+class RespError(Exception):
+    """An error reply from the server"""
+
+def encode_command(*args) -> bytes:
+    """A command as a RESP array of bulk strings"""
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+async def read_reply(reader: asyncio.StreamReader):
+    """One reply: str for +, int for :, bytes (or None) for $, list for *; - raises RespError"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise RespError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RespError(f"Unexpected reply: {line!r}")
+
+class RespClient:
+    """A small pool of connections to redis://[:password@]host[:port][/db].
+
+    Each command borrows a connection for one round trip, so concurrent requests
+    don't queue behind each other; a connection that errors mid-reply is dropped.
+    """
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.idle = asyncio.LifoQueue(maxsize=pool_size)
+        self.slots = asyncio.Semaphore(pool_size)
+
+    async def connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        if self.password:
+            writer.write(encode_command("AUTH", self.password))
+            await read_reply(reader)
+        if self.db:
+            writer.write(encode_command("SELECT", self.db))
+            await read_reply(reader)
+        return reader, writer
+
+    async def command(self, *args):
+        """Send one command and return its reply"""
+        async with self.slots:
+            connection = self.idle.get_nowait() if not self.idle.empty() else await self.connect()
+            reader, writer = connection
+            try:
+                writer.write(encode_command(*args))
+                reply = await asyncio.wait_for(read_reply(reader), self.timeout)
+            except RespError:
+                self.idle.put_nowait(connection)  # The connection is still in sync after an error reply
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            self.idle.put_nowait(connection)
+            return reply
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.command("GET", key)
+
+    async def set(self, key: str, value: bytes, ex: int = None, nx: bool = False) -> bool:
+        """False if nx was given and the key already existed"""
+        args = ["SET", key, value] + (["EX", ex] if ex else []) + (["NX"] if nx else [])
+        return await self.command(*args) is not None
+
+    async def delete(self, key: str) -> int:
+        return await self.command("DEL", key)
+
+    async def close(self) -> None:
+        while not self.idle.empty():
+            _, writer = self.idle.get_nowait()
+            writer.close()
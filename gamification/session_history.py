@@ -0,0 +1,114 @@
+"""Session History - Session lifecycle (created, stages completed, XP) recorded in the sessions table, write-behind
+
+Routes call created()/progressed(), which only update an in-memory buffer. A
+background task writes the buffer in one transaction every SESSION_HISTORY_FLUSH_MS,
+or sooner once SESSION_HISTORY_BATCH events are waiting, so requests never wait
+on SQLite. Updates to the same session between flushes collapse into one row write.
+"""
+import os
+import time
+import asyncio
+from sqlalchemy.dialects.sqlite import insert
+
+from .database import engine
+from .models_db import QuestSession
+from .models import LearningSession
+
+FLUSH_INTERVAL = float(os.getenv("SESSION_HISTORY_FLUSH_MS", "500")) / 1000
+FLUSH_BATCH = int(os.getenv("SESSION_HISTORY_BATCH", "200"))  # Events that trigger an early flush
+
+class SessionHistory:
+    """Write-behind buffer of QuestSession rows: session_id -> columns to upsert"""
+
+    def __init__(self, interval: float = FLUSH_INTERVAL, batch: int = FLUSH_BATCH):
+        self.interval = interval
+        self.batch = batch
+        self.pending = {}
+        self.events = 0
+        self.wakeup = None
+        self.task = None
+        self.counters = {"events": 0, "rows_written": 0, "flushes": 0, "failures": 0}
+        self.flush_ms = 0.0  # Moving average
+
+    def created(self, session: LearningSession) -> None:
+        """A new session - featured quests reference shared content, everything else was generated"""
+        self.record(session.session_id, {
+            "topic": session.topic,
+            "ai_generated": session.content is None,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def progressed(self, session: LearningSession) -> None:
+        """A stage was completed"""
+        self.record(session.session_id, {
+            "stages_completed": sum((session.story_completed, session.quiz_completed,
+                                     session.master_completed, session.detective_completed)),
+            "completed": session.detective_completed,
+            "xp_earned": session.total_xp_earned,
+        })
+
+    def record(self, session_id: str, columns: dict) -> None:
+        self.pending.setdefault(session_id, {}).update(columns)
+        self.events += 1
+        self.counters["events"] += 1
+        self.start()
+        if self.events >= self.batch:
+            self.wakeup.set()
+
+    def start(self) -> None:
+        """Start the flush task (needs a running event loop)"""
+        if self.task:
+            return
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write everything buffered so far in one transaction"""
+        if not self.pending:
+            return
+        batch, self.pending, self.events = self.pending, {}, 0
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.write, batch)
+        except Exception as e:
+            print(f"[HISTORY] Flush of {len(batch)} sessions failed: {type(e).__name__}: {e}")
+            self.counters["failures"] += 1
+            for session_id, columns in batch.items():  # Keep them for the next flush, newer values win
+                self.pending[session_id] = {**columns, **self.pending.get(session_id, {})}
+            return
+        self.counters["flushes"] += 1
+        self.counters["rows_written"] += len(batch)
+        self.flush_ms = 0.8 * self.flush_ms + 0.2 * (time.perf_counter() - started) * 1000
+
+    def write(self, batch: dict) -> None:
+        with engine.begin() as connection:
+            for session_id, columns in batch.items():
+                connection.execute(insert(QuestSession).values(id=session_id, **columns).on_conflict_do_update(
+                    index_elements=["id"], set_=columns
+                ))
+
+    async def close(self) -> None:
+        """Stop the flush task and write whatever is left (graceful shutdown)"""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "pending": len(self.pending),
+            "avg_flush_ms": round(self.flush_ms, 1),
+        }
+
+session_history = SessionHistory()
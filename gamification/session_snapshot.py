@@ -0,0 +1,71 @@
+"""Session Snapshot - Live sessions written to one file at shutdown and read back one by one after a restart
+
+Layout: a JSON header line, then one record per session:
+    !HdI (id length, idle deadline, state length) | session id | state (as in session_store)
+
+The header carries the file format and a fingerprint of the LearningSession schema.
+A file in another format is ignored. A schema change is logged, and then each record
+is validated as it's restored; a record that no longer fits is dropped rather than
+loaded half-right.
+"""
+import os
+import json
+import time
+import struct
+import hashlib
+from pathlib import Path
+from typing import Iterable
+
+from .models import LearningSession
+
+SNAPSHOT_FORMAT = 1
+RECORD = struct.Struct("!HdI")
+
+def schema_fingerprint() -> str:
+    """Changes whenever a field is added to, removed from or retyped in LearningSession (or the models it holds)"""
+    schema = json.dumps(LearningSession.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+def write_snapshot(path: Path, records: Iterable[tuple[str, float, bytes]]) -> int:
+    """Write (session id, deadline, state) records atomically, returning how many were written"""
+    records = list(records)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(".tmp")
+    with open(temp, "wb") as f:
+        header = {"format": SNAPSHOT_FORMAT, "schema": schema_fingerprint(), "created_at": time.time(), "sessions": len(records)}
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+        for session_id, deadline, state in records:
+            key = session_id.encode("utf-8")
+            f.write(RECORD.pack(len(key), deadline, len(state)) + key + state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    return len(records)
+
+def read_index(path: Path) -> dict:
+    """session id -> (offset, length, deadline) of every unexpired record, without reading the states"""
+    index = {}
+    with open(path, "rb") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("format") != SNAPSHOT_FORMAT:
+            print(f"[SNAPSHOT] Ignoring {path.name}: format {header.get('format')}, expected {SNAPSHOT_FORMAT}")
+            return index
+        if header.get("schema") != schema_fingerprint():
+            print(f"[SNAPSHOT] {path.name} was written with another session schema - sessions that no longer validate will be dropped")
+        now = time.time()
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                break
+            key_length, deadline, length = RECORD.unpack(head)
+            session_id = f.read(key_length).decode("utf-8")
+            offset = f.tell()
+            f.seek(length, os.SEEK_CUR)
+            if deadline > now:
+                index[session_id] = (offset, length, deadline)
+    return index
+
+def read_record(path: Path, offset: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
@@ -0,0 +1,441 @@
+"""Session Store - Learning sessions kept where every worker can reach them (memory, SQLite or a Redis-protocol server)
+
+SESSION_STORE picks the backend:
+    memory  - held in this process (cold ones spilled to disk); only correct with a single worker
+    sqlite  - the sessions table in data/gamify.db (WAL), shared by every worker on the host
+    redis   - any Redis-protocol server at SESSION_STORE_URL, shared across hosts
+
+Sessions are stored as compact JSON (default fields left out, zlib above a size
+threshold). Featured-quest sessions only hold a content reference, so they stay
+a few hundred bytes; AI sessions carry their generated content inline.
+"""
+import os
+import time
+import zlib
+import shutil
+import socket
+import asyncio
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from .database import SessionLocal
+from .models_db import QuestSession
+from .models import LearningSession
+from .resp_client import RespClient
+from .timing_wheel import TimingWheel
+from .session_snapshot import write_snapshot, read_index, read_record
+
+# Snapshot ownership between worker processes needs flock (not on Windows, where it's skipped)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite").lower()
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "redis://127.0.0.1:6379/0")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 3600)))  # Seconds an untouched session is kept
+STAGE_WAIT = float(os.getenv("SESSION_STAGE_WAIT", "60"))   # Seconds to wait for stages another worker is generating
+MEMORY_LIMIT = int(float(os.getenv("SESSION_MEMORY_LIMIT_MB", "256")) * 1024 * 1024)  # Memory store, per worker
+SPILL_DIR = Path(os.getenv("SESSION_SPILL_DIR", Path(__file__).parent.parent / "data" / "session_spill"))
+SNAPSHOT_FILE = os.getenv("SESSION_SNAPSHOT_FILE", str(Path(__file__).parent.parent / "data" / "sessions.snapshot"))  # "" disables
+COMPRESS_ABOVE = 1024  # Serialized sessions larger than this (bytes) are zlib-compressed
+PRUNE_EVERY = 500      # SQLite writes between sweeps of expired session state
+STAGES = ("story", "quiz", "master", "detective")  # Claim bits in the sessions table's claimed column
+
+# ==================== Serialization ====================
+
+def to_json(session: LearningSession) -> bytes:
+    """A session as JSON without default values"""
+    return session.model_dump_json(exclude_defaults=True).encode("utf-8")
+
+def pack(data: bytes) -> bytes:
+    return zlib.compress(data) if len(data) > COMPRESS_ABOVE else data
+
+def unpack(blob: bytes) -> bytes:
+    return blob if blob[:1] == b"{" else zlib.decompress(blob)
+
+def dump_session(session: LearningSession) -> bytes:
+    """A session as compact bytes - JSON without default values, compressed when large"""
+    return pack(to_json(session))
+
+def load_session(blob: bytes) -> LearningSession:
+    return LearningSession.model_validate_json(unpack(blob))
+
+# ==================== Backends ====================
+
+class SessionStore:
+    """Where sessions live between requests. get() returns a copy, so changes need a save().
+
+    Concurrent requests for one session each get their own copy, so whatever must happen
+    only once per session (awarding a stage's XP) is decided by claim(), not by the copy.
+    """
+
+    name = "base"
+
+    async def get(self, session_id: str) -> Optional[LearningSession]:
+        raise NotImplementedError
+
+    async def save(self, session: LearningSession) -> None:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    async def claim(self, session_id: str, stage: str) -> bool:
+        """True for the first caller to complete this stage of the session, False for every other"""
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        """Called once the event loop is running"""
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+class MemorySessionStore(SessionStore):
+    """Sessions held in this process as their JSON - fastest, but invisible to other workers.
+
+    Each get() parses a fresh object, so concurrent requests never share (or half-see)
+    each other's changes. Idle sessions expire after the TTL via a timing wheel. Above
+    the memory limit the least recently used ones are spilled to files and read back
+    when touched again.
+
+    On shutdown (SIGTERM included) every live session goes into a snapshot file. After a
+    restart only the file's index is read; each session is loaded the first time it's used.
+    The snapshot belongs to whichever worker locks it first - any other worker (a
+    misconfigured -w 4) neither restores nor overwrites it.
+    """
+
+    name = "memory"
+
+    def __init__(self, ttl: int = SESSION_TTL, max_bytes: int = MEMORY_LIMIT, spill_dir: Path = SPILL_DIR,
+                 snapshot_file: str = SNAPSHOT_FILE):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sessions = OrderedDict()  # session_id -> session JSON, least recently used first
+        self.sizes = {}                # session_id -> length of its JSON, for sessions in memory
+        self.bytes = 0
+        self.spilled = {}              # session_id -> bytes, for sessions on disk
+        self.spilled_bytes = 0
+        self.wheel = TimingWheel(ttl)
+        self.spill_dir = Path(spill_dir) / f"{socket.gethostname()}-{os.getpid()}"
+        shutil.rmtree(self.spill_dir, ignore_errors=True)  # Left over from an earlier process with this pid
+        self.snapshot_path = Path(snapshot_file) if snapshot_file else None
+        self.snapshot_index = {}       # session_id -> (offset, length, deadline), for sessions not yet restored
+        self.restoring = None          # Task reading the snapshot's index
+        self.snapshot_lock = None      # Open lock file while this process owns the snapshot
+        self.claims = {}               # session_id -> stages already completed in this process
+        self.counters = {"expired": 0, "spills": 0, "reloads": 0, "restored": 0}
+
+    def touch(self, session_id: str) -> None:
+        self.wheel.schedule(session_id, time.time() + self.ttl)
+
+    def expire(self) -> None:
+        for session_id in self.wheel.expire():
+            self.forget(session_id)
+            self.counters["expired"] += 1
+
+    def forget(self, session_id: str) -> None:
+        self.claims.pop(session_id, None)
+        if session_id in self.sessions:
+            del self.sessions[session_id]
+            self.bytes -= self.sizes.pop(session_id)
+        elif session_id in self.spilled:
+            self.spilled_bytes -= self.spilled.pop(session_id)
+            self.spill_path(session_id).unlink(missing_ok=True)
+        else:
+            self.snapshot_index.pop(session_id, None)
+
+    def spill_path(self, session_id: str) -> Path:
+        return self.spill_dir / f"{session_id}.session"
+
+    def keep(self, session_id: str, data: bytes) -> None:
+        """Hold a session's JSON in memory, spilling the coldest ones to disk while over the limit"""
+        self.sessions[session_id] = data
+        self.sessions.move_to_end(session_id)
+        self.bytes += len(data) - self.sizes.get(session_id, 0)
+        self.sizes[session_id] = len(data)
+        # Spill files are small and never fsynced, so writing them inline is cheap
+        while self.bytes > self.max_bytes and len(self.sessions) > 1:
+            session_id, cold = self.sessions.popitem(last=False)
+            self.bytes -= self.sizes.pop(session_id)
+            blob = pack(cold)
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            self.spill_path(session_id).write_bytes(blob)
+            self.spilled[session_id] = len(blob)
+            self.spilled_bytes += len(blob)
+            self.counters["spills"] += 1
+
+    def reload(self, session_id: str) -> Optional[LearningSession]:
+        """Bring a spilled session back into memory"""
+        path = self.spill_path(session_id)
+        self.spilled_bytes -= self.spilled.pop(session_id)
+        try:
+            data = unpack(path.read_bytes())
+            session = LearningSession.model_validate_json(data)
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"[SESSIONS] Could not reload {session_id}: {type(e).__name__}: {e}")
+            return None
+        path.unlink(missing_ok=True)
+        self.counters["reloads"] += 1
+        self.keep(session_id, data)
+        return session
+
+    def restore(self, session_id: str) -> Optional[LearningSession]:
+        """Load a session from the snapshot taken before the last restart"""
+        offset, length, _ = self.snapshot_index.pop(session_id)
+        try:
+            data = unpack(read_record(self.restore_path, offset, length))
+            session = LearningSession.model_validate_json(data)
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"[SNAPSHOT] Could not restore {session_id}: {type(e).__name__}: {e}")
+            return None
+        self.counters["restored"] += 1
+        self.keep(session_id, data)
+        if not self.snapshot_index:
+            self.restore_path.unlink(missing_ok=True)
+        return session
+
+    async def get(self, session_id: str) -> Optional[LearningSession]:
+        if self.restoring:
+            await self.restoring
+        self.expire()
+        session = None
+        if session_id in self.sessions:
+            self.sessions.move_to_end(session_id)
+            session = LearningSession.model_validate_json(self.sessions[session_id])
+        elif session_id in self.spilled:
+            session = self.reload(session_id)
+        elif session_id in self.snapshot_index:
+            session = self.restore(session_id)
+        if session:
+            self.touch(session_id)
+        return session
+
+    async def save(self, session: LearningSession) -> None:
+        self.expire()
+        if session.session_id in self.spilled or session.session_id in self.snapshot_index:
+            self.forget(session.session_id)  # A stale copy - the caller's is newer
+        self.keep(session.session_id, to_json(session))
+        self.touch(session.session_id)
+
+    async def delete(self, session_id: str) -> None:
+        self.forget(session_id)
+        self.wheel.cancel(session_id)
+
+    async def claim(self, session_id: str, stage: str) -> bool:
+        # No await between the check and the add, so no other request can slip in
+        claimed = self.claims.setdefault(session_id, set())
+        if stage in claimed:
+            return False
+        claimed.add(stage)
+        return True
+
+    @property
+    def restore_path(self) -> Path:
+        return self.snapshot_path.with_suffix(".restoring")
+
+    async def start(self) -> None:
+        """Pick up the snapshot left by the previous process, if any, without waiting to read it"""
+        if self.snapshot_path and not self.snapshot_lock:
+            if not self.lock_snapshot():
+                print(f"[SNAPSHOT] {self.snapshot_path.name} is owned by another worker - sessions on this one won't survive a restart")
+                return
+            self.restoring = asyncio.create_task(self.read_snapshot())
+
+    def lock_snapshot(self) -> bool:
+        """Take the snapshot for this process, held until close() - False if another process has it"""
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        lock = open(self.snapshot_path.with_suffix(".lock"), "a")
+        if fcntl:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                return False
+        self.snapshot_lock = lock
+        return True
+
+    async def read_snapshot(self) -> None:
+        # Moved aside first: if this process dies without a new snapshot, the next one must not restore stale sessions
+        self.restore_path.unlink(missing_ok=True)
+        try:
+            os.replace(self.snapshot_path, self.restore_path)
+        except FileNotFoundError:
+            return
+        started = time.perf_counter()
+        try:
+            index = await asyncio.to_thread(read_index, self.restore_path)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            print(f"[SNAPSHOT] Could not read {self.restore_path.name}: {type(e).__name__}: {e}")
+            index = {}
+        for session_id, (offset, length, deadline) in index.items():
+            if session_id not in self.sessions:
+                self.snapshot_index[session_id] = (offset, length, deadline)
+                self.wheel.schedule(session_id, deadline)
+        if not self.snapshot_index:
+            self.restore_path.unlink(missing_ok=True)
+        print(f"[SNAPSHOT] {len(self.snapshot_index)} sessions to restore on demand ({(time.perf_counter() - started) * 1000:.0f}ms)")
+
+    def snapshot_records(self):
+        """(session id, deadline, state) of every live session, wherever it is right now"""
+        now = time.time()
+        deadline = lambda session_id: self.wheel.deadlines.get(session_id, now + self.ttl)
+        for session_id, data in self.sessions.items():
+            yield session_id, deadline(session_id), pack(data)
+        for session_id in self.spilled:
+            try:
+                yield session_id, deadline(session_id), self.spill_path(session_id).read_bytes()
+            except OSError:
+                continue
+        for session_id, (offset, length, _) in self.snapshot_index.items():
+            yield session_id, deadline(session_id), read_record(self.restore_path, offset, length)
+
+    async def close(self) -> None:
+        """Snapshot live sessions for the next process, then drop the spill files"""
+        if self.restoring:
+            await self.restoring
+        if self.snapshot_lock:
+            self.expire()
+            started = time.perf_counter()
+            try:
+                count = write_snapshot(self.snapshot_path, self.snapshot_records())
+                print(f"[SNAPSHOT] Saved {count} sessions in {(time.perf_counter() - started) * 1000:.0f}ms")
+                self.restore_path.unlink(missing_ok=True)
+            except OSError as e:
+                print(f"[SNAPSHOT] Could not save sessions: {type(e).__name__}: {e}")
+            self.snapshot_lock.close()  # Releases the lock
+            self.snapshot_lock = None
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "sessions": len(self.sessions),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "spilled": len(self.spilled),
+            "spilled_bytes": self.spilled_bytes,
+            "awaiting_restore": len(self.snapshot_index),
+            **self.counters,
+        }
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in the QuestSession table: one row per session, its live state in the state column"""
+
+    name = "sqlite"
+
+    def __init__(self, ttl: int = SESSION_TTL):
+        self.ttl = ttl
+        self.writes = 0
+
+    def read(self, session_id: str) -> Optional[bytes]:
+        db = SessionLocal()
+        try:
+            row = db.query(QuestSession.state, QuestSession.updated_at).filter(QuestSession.id == session_id).first()
+            if not row or row.state is None or time.time() - (row.updated_at or 0) > self.ttl:
+                return None
+            return row.state
+        finally:
+            db.close()
+
+    def write(self, session: LearningSession, blob: bytes) -> None:
+        now = time.time()
+        db = SessionLocal()
+        try:
+            # Upsert so the session history's writes to the same row (other columns) never collide
+            db.execute(insert(QuestSession).values(
+                id=session.session_id, topic=session.topic, created_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+                state=blob, updated_at=now
+            ).on_conflict_do_update(index_elements=["id"], set_={"state": blob, "updated_at": now}))
+            db.commit()
+
+            self.writes += 1
+            if self.writes % PRUNE_EVERY == 0:
+                db.query(QuestSession).filter(QuestSession.updated_at < now - self.ttl).update({"state": None})
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[SESSIONS] Write failed for {session.session_id}: {type(e).__name__}: {e}")
+            raise
+        finally:
+            db.close()
+
+    def clear(self, session_id: str) -> None:
+        db = SessionLocal()
+        try:
+            db.query(QuestSession).filter(QuestSession.id == session_id).update({"state": None})
+            db.commit()
+        finally:
+            db.close()
+
+    def mark(self, session_id: str, stage: str) -> bool:
+        """Set the stage's bit in the claimed column - only the update that flips it changes a row"""
+        bit = 1 << STAGES.index(stage)
+        db = SessionLocal()
+        try:
+            claimed = func.coalesce(QuestSession.claimed, 0)
+            updated = db.query(QuestSession).filter(QuestSession.id == session_id, claimed.op("&")(bit) == 0) \
+                .update({"claimed": claimed.op("|")(bit)}, synchronize_session=False)
+            db.commit()
+            return updated == 1
+        finally:
+            db.close()
+
+    async def get(self, session_id: str) -> Optional[LearningSession]:
+        blob = await asyncio.to_thread(self.read, session_id)
+        return load_session(blob) if blob else None
+
+    async def save(self, session: LearningSession) -> None:
+        await asyncio.to_thread(self.write, session, dump_session(session))
+
+    async def delete(self, session_id: str) -> None:
+        await asyncio.to_thread(self.clear, session_id)
+
+    async def claim(self, session_id: str, stage: str) -> bool:
+        return await asyncio.to_thread(self.mark, session_id, stage)
+
+class RedisSessionStore(SessionStore):
+    """Sessions as keys on a Redis-protocol server, expired by the server after SESSION_TTL"""
+
+    name = "redis"
+
+    def __init__(self, url: str = SESSION_STORE_URL, ttl: int = SESSION_TTL, prefix: str = "gamify:session:"):
+        self.client = RespClient(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, session_id: str) -> Optional[LearningSession]:
+        blob = await self.client.get(self.prefix + session_id)
+        return load_session(blob) if blob else None
+
+    async def save(self, session: LearningSession) -> None:
+        await self.client.set(self.prefix + session.session_id, dump_session(session), ex=self.ttl)
+
+    async def delete(self, session_id: str) -> None:
+        await self.client.delete(self.prefix + session_id)
+
+    async def claim(self, session_id: str, stage: str) -> bool:
+        return await self.client.set(f"{self.prefix}{session_id}:{stage}", b"1", ex=self.ttl, nx=True)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+BACKENDS = {
+    "memory": MemorySessionStore,
+    "sqlite": SqliteSessionStore,
+    "redis": RedisSessionStore,
+}
+
+def create_session_store(backend: str = SESSION_STORE) -> SessionStore:
+    """The configured backend (unknown names fall back to sqlite)"""
+    if backend not in BACKENDS:
+        print(f"[SESSIONS] Unknown SESSION_STORE '{backend}', using sqlite")
+        backend = "sqlite"
+    print(f"[SESSIONS] Using {backend} session store")
+    return BACKENDS[backend]()
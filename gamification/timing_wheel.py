@@ -0,0 +1,52 @@
+"""Timing Wheel - Deadlines bucketed on a ring of time slots, so expiring them costs O(expired) and not O(keys)"""
+import math
+import time
+from typing import Hashable
+
+WHEEL_SLOTS = 600  # Slots per revolution; a deadline may fire up to horizon / WHEEL_SLOTS seconds late
+
+class TimingWheel:
+    """Keys with deadlines at most `horizon` seconds ahead, expired a slot at a time.
+
+    Each slot holds the keys due within one tick. expire() walks only the slots
+    that have come due since the last call, so a sweep touches the keys it
+    expires (plus the odd key a full revolution ahead after a long idle gap).
+    """
+
+    def __init__(self, horizon: float, slots: int = WHEEL_SLOTS):
+        self.tick = max(horizon / slots, 0.001)
+        self.slots = [set() for _ in range(slots + 2)]  # +2: the partly elapsed tick and rounding
+        self.deadlines = {}  # key -> deadline (unix time)
+        self.positions = {}  # key -> index of the slot it's in
+        self.current = int(time.time() / self.tick)  # Last tick swept
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Set (or move) a key's deadline"""
+        self.cancel(key)
+        index = max(math.ceil(deadline / self.tick), self.current + 1) % len(self.slots)
+        self.slots[index].add(key)
+        self.deadlines[key] = deadline
+        self.positions[key] = index
+
+    def cancel(self, key: Hashable) -> None:
+        if key in self.deadlines:
+            self.slots[self.positions.pop(key)].discard(key)
+            del self.deadlines[key]
+
+    def expire(self, now: float = None) -> list:
+        """Remove and return the keys whose deadline has passed"""
+        now = now or time.time()
+        due_tick = int(now / self.tick)
+        expired = []
+        # After an idle gap longer than a revolution, one pass over every slot is enough
+        for tick in range(self.current + 1, min(due_tick, self.current + len(self.slots)) + 1):
+            slot = self.slots[tick % len(self.slots)]
+            due = [key for key in slot if self.deadlines[key] <= now]
+            for key in due:
+                self.cancel(key)
+            expired.extend(due)
+        self.current = max(self.current, due_tick)
+        return expired
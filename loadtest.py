@@ -0,0 +1,85 @@
+"""Load Test - Drive full learning sessions against a running server and report latency
+
+    python loadtest.py --base-url http://127.0.0.1:8000 --sessions 200 --concurrency 50 --topics 20
+
+Each session walks start -> complete-story -> submit-quiz -> submit-master -> solve-case.
+Custom topics are "Load Test Topic <n>" spread over --topics distinct topics (so repeats
+exercise the content store), plus --featured-share of featured quests.
+Pair with mock_openrouter.py to measure the server without touching OpenRouter.
+Sessions are spread over --clients simulated clients (X-Forwarded-For), which the
+server's fair generation queue tells apart; 429s from admission control count as errors.
+"""
+import time
+import random
+import asyncio
+import argparse
+import httpx
+
+STEPS = ["start", "complete-story", "submit-quiz", "submit-master", "solve-case"]
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run_session(client: httpx.AsyncClient, topic: str, learner: str, timings: dict, errors: dict) -> None:
+    async def step(name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, headers={"X-Forwarded-For": learner}, **kwargs)
+        timings[name].append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors[name] = errors.get(name, 0) + 1
+            return None
+        return response.json()
+
+    session = await step("start", "POST", "/api/session/start", json={"topic": topic})
+    if not session:
+        return
+    base = f"/api/session/{session['session_id']}"
+    if not await step("complete-story", "POST", f"{base}/complete-story"):
+        return
+    if not await step("submit-quiz", "POST", f"{base}/submit-quiz", json={"answers": [0, 0, 0, 0, 0]}):
+        return
+    if not await step("submit-master", "POST", f"{base}/submit-master", json={"answers": ["A", "A", "A"]}):
+        return
+    await step("solve-case", "POST", f"{base}/solve-case", json={"answer": "A"})
+
+async def run(base_url: str, sessions: int, concurrency: int, topics: int, featured_share: float, clients: int) -> None:
+    timings = {name: [] for name in STEPS}
+    errors = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        async def one(i: int):
+            topic = "Python" if random.random() < featured_share else f"Load Test Topic {i % topics}"
+            learner = f"10.0.{i % clients // 256}.{i % clients % 256}"
+            async with semaphore:
+                await run_session(client, topic, learner, timings, errors)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(sessions)))
+        elapsed = time.perf_counter() - started
+
+    print(f"{sessions} sessions in {elapsed:.1f}s ({sessions / elapsed:.1f} sessions/s, concurrency {concurrency})")
+    print(f"{'step':<16}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'errors':>8}")
+    for name in STEPS:
+        values = timings[name]
+        print(f"{name:<16}{len(values):>7}"
+              f"{percentile(values, 50):>9.3f}{percentile(values, 95):>9.3f}{percentile(values, 99):>9.3f}"
+              f"{max(values, default=0):>9.3f}{errors.get(name, 0):>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-session load test for Gamify AI")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--topics", type=int, default=10, help="Distinct custom topics")
+    parser.add_argument("--featured-share", type=float, default=0.2, help="Fraction of sessions on a featured quest")
+    parser.add_argument("--clients", type=int, default=50, help="Simulated clients the sessions come from")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    asyncio.run(run(args.base_url, args.sessions, args.concurrency, args.topics, args.featured_share, args.clients))
@@ -1,12 +1,15 @@
 """Gamify AI V2 - Story-Based Learning Platform"""
 import os
+import json
+import time
 import uuid
+import asyncio
 from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
@@ -16,12 +19,25 @@ load_dotenv()
 
 # Import our modules
 from gamification import add_xp, get_stats, increment_stat, unlock_achievement
-from modules.unified_generator import generate_all_content
-from modules.prebuilt_quests import get_all_quest_info
+from modules.unified_generator import generate_all_content, generate_story_content, get_ready_content, stream_all_content, speculate_next_level, sync_topic_index, router, GENERATION_MODE
+from modules.speculative import speculative_cache
+from modules.llm_client import registry as llm_clients
+from modules.rate_limiter import rate_limiter
+from modules.lazy_stages import LazyStages
+from modules.pipeline import stage_stats
+from modules.topic_index import topic_index
+from modules.jobs import JobQueue, Job
+from modules.admission import admission, current_client, AdmissionRejected, TRUSTED_PROXY_HOPS
+from modules.prebuilt_quests import get_all_quest_info, is_featured_quest
+from modules.payloads import story_view, session_payload, json_response
+from modules.content_registry import get_stage
 from modules.quiz_mode import score_quiz
 from modules.master_mode import score_master
 from modules.detective_mode import solve_case
 from gamification.models import LearningSession
+from gamification.session_store import create_session_store, STAGE_WAIT, SESSION_TTL
+from gamification.timing_wheel import TimingWheel
+from gamification.session_history import session_history
 
 # Initialize FastAPI
 app = FastAPI(title="Gamify AI", description="Transform any topic into a game!")
@@ -44,8 +60,15 @@ templates_path.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory=static_path), name="static")
 templates = Jinja2Templates(directory=templates_path)
 
-# In-memory storage for active sessions
-active_sessions = {}
+# Learning sessions, shared by every worker (unless SESSION_STORE=memory)
+sessions = create_session_store()
+
+# Streamed sessions whose quiz/master/detective are still being generated on this worker
+session_tasks = {}
+
+# Lazy-mode sessions whose later stages are generated one step ahead of the learner
+lazy_sessions = {}
+lazy_expiry = TimingWheel(SESSION_TTL)  # Drops the stages of sessions abandoned part way
 
 # ==================== Request Models ====================
 
@@ -84,90 +107,283 @@ async def get_featured_quests():
     quests = get_all_quest_info()
     return {"quests": quests}
 
+@app.get("/api/metrics")
+async def api_metrics():
+    """Generation health for monitoring (per worker)"""
+    return {
+        "worker_pid": os.getpid(),
+        "models": router.snapshot(),
+        "speculative": speculative_cache.stats(),
+        "llm_clients": llm_clients.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "stages": stage_stats.snapshot(),
+        "topic_index": topic_index.stats(),
+        "jobs": generation_jobs.stats(),
+        "admission": admission.stats(),
+        "sessions": sessions.stats(),
+        "session_history": session_history.stats()
+    }
+
 # ==================== Learning Session ====================
 
+def client_id(request: Request) -> str:
+    """Who a request is from, for fair generation queueing.
+
+    Entries left of those our own proxies appended are whatever the client sent, so
+    the address is read TRUSTED_PROXY_HOPS entries from the right (Render adds one).
+    """
+    forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if forwarded and TRUSTED_PROXY_HOPS > 0:
+        return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+    return request.client.host if request.client else "anonymous"
+
+def busy_response(message: str, retry_after: int) -> JSONResponse:
+    return JSONResponse(
+        {"error": True, "message": message},
+        status_code=429,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+def reject_if_busy(topic: str, client: str, backlog: int = 0) -> Optional[JSONResponse]:
+    """Fast 429 when this worker can't queue another generation - featured quests, and next
+    levels already being generated speculatively, always get through"""
+    if is_featured_quest(topic) or speculative_cache.generating(topic):
+        return None
+    if not admission.would_reject(client) and backlog < admission.max_queued:
+        return None
+    return busy_response(
+        "Lots of adventures are being generated right now. Please try again in a moment, or try a Featured Quest!",
+        admission.retry_after()
+    )
+
+@app.middleware("http")
+async def identify_client(request: Request, call_next):
+    """Charge any generation a request starts (e.g. a lazy stage) to its client"""
+    current_client.set(client_id(request))
+    return await call_next(request)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, error: AdmissionRejected):
+    """A stage generated on demand couldn't get a slot - the same 429 a new custom topic gets"""
+    return busy_response(
+        "Lots of adventures are being generated right now. Please try again in a moment!",
+        error.retry_after
+    )
+
 @app.post("/api/session/start")
-async def start_session(data: TopicRequest):
-    """Start a new learning session - generates ALL content at once"""
+async def start_session(data: TopicRequest, request: Request):
+    """Start a new learning session - generates ALL content at once (or just the story in lazy mode)"""
     session_id = str(uuid.uuid4())[:8]
+    current_client.set(client_id(request))
     
-    # Generate ALL content in one API call
-    content = generate_all_content(data.topic, user_api_key=data.api_key)
+    if GENERATION_MODE == "lazy":
+        content = await generate_story_content(data.topic, user_api_key=data.api_key)
+    else:
+        # Generate ALL content in one API call (awaited, so the worker keeps serving other requests)
+        content = await generate_all_content(data.topic, user_api_key=data.api_key)
     
     # Check if generation failed
+    if content.get("retry_after"):
+        return busy_response(content["message"], content["retry_after"])
     if content.get("error"):
         return JSONResponse(
             {"error": True, "message": content["message"]}, 
             status_code=503
         )
     
-    session = LearningSession(
+    session = new_session(session_id, data.topic, content)
+    await sessions.save(session)
+    session_history.created(session)
+    if not get_stage(session, "quiz"):
+        start_lazy_stages(session, data.api_key)
+    
+    return json_response({
+        "session_id": session_id,
+        "topic": data.topic,
+        "ai_generated": content.get("success", False),
+        "source": content.get("source", "unknown")
+    }, story=session_payload(session, "story"))
+
+def new_session(session_id: str, topic: str, content: dict) -> LearningSession:
+    """A session on generated content - featured quests are referenced, not copied"""
+    if content.get("content_ref"):
+        return LearningSession(session_id=session_id, topic=topic, current_mode="story", content=content["content_ref"])
+    return LearningSession(
         session_id=session_id,
-        topic=data.topic,
+        topic=topic,
         current_mode="story",
         story=content["story"],
-        quiz=content["quiz"],
-        master=content["master"],
-        detective=content["detective"]
+        quiz=content.get("quiz"),
+        master=content.get("master"),
+        detective=content.get("detective")
     )
+
+@app.post("/api/session/start-stream")
+async def start_session_stream(data: TopicRequest, request: Request):
+    """Start a learning session, streaming the story (SSE) before the other stages finish"""
+    client = client_id(request)
+    rejected = reject_if_busy(data.topic, client)
+    if rejected:
+        return rejected
     
-    active_sessions[session_id] = session
+    current_client.set(client)
+    events = start_streamed_session(data.topic, data.api_key)
     
-    return {
-        "session_id": session_id,
-        "topic": data.topic,
-        "ai_generated": content.get("success", False),
-        "source": content.get("source", "unknown"),
-        "story": {
-            "title": content["story"].title,
-            "content": content["story"].content,
-            "xp_reward": content["story"].xp_reward
-        }
-    }
+    async def event_stream():
+        while True:
+            event, payload = await events.get()
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            if event in ("ready", "error"):
+                break
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def start_streamed_session(topic: str, api_key: Optional[str]) -> asyncio.Queue:
+    """Start generating a session in the background - returns the queue its story/ready/error events arrive on"""
+    session_id = str(uuid.uuid4())[:8]
+    events = asyncio.Queue()
+    
+    # Generation runs independently of the caller so a dropped connection doesn't lose it
+    task = asyncio.create_task(fill_streamed_session(session_id, topic, api_key, events))
+    session_tasks[session_id] = task
+    task.add_done_callback(lambda _: session_tasks.pop(session_id, None))
+    return events
+
+async def fill_streamed_session(session_id: str, topic: str, api_key: Optional[str], events: asyncio.Queue):
+    """Create the session when the story arrives, attach the other stages when they finish"""
+    session = None
+    try:
+        async for update in stream_all_content(topic, user_api_key=api_key):
+            if update["event"] == "story":
+                story = update["story"]
+                session = new_session(session_id, topic, update)
+                session.stages_pending = not session.content
+                await sessions.save(session)
+                session_history.created(session)
+                await events.put(("story", {
+                    "session_id": session_id,
+                    "topic": topic,
+                    "ai_generated": True,
+                    "source": update["source"],
+                    "story": story_view(story)
+                }))
+            elif update["event"] == "content":
+                session = await sessions.get(session_id) or session
+                if not session.content:
+                    session.quiz = update.get("quiz")
+                    session.master = update.get("master")
+                    session.detective = update.get("detective")
+                session.stages_pending = False
+                await sessions.save(session)
+                if not get_stage(session, "quiz"):
+                    start_lazy_stages(session, api_key)
+                await events.put(("ready", {"session_id": session_id, "source": update["source"]}))
+            else:
+                await events.put(("error", {"message": update["message"]}))
+    except Exception as e:
+        print(f"[STREAM] Session {session_id} failed: {type(e).__name__}: {e}")
+        await events.put(("error", {"message": "AI generation unavailable. Please try one of our Featured Quests instead! 🎮"}))
+    finally:
+        if session and session.stages_pending:
+            # Nothing more is coming from this worker (failed, or shutting down) - the stages
+            # will be generated when they're needed
+            session.stages_pending = False
+            await sessions.save(session)
+
+def start_lazy_stages(session: LearningSession, api_key: Optional[str]) -> LazyStages:
+    """Begin generating a story-only session's quiz in the background"""
+    stages = LazyStages(session.topic, get_stage(session, "story").key_facts, api_key)
+    stages.prefetch("quiz")
+    lazy_sessions[session.session_id] = stages
+    for session_id in lazy_expiry.expire():
+        lazy_sessions.pop(session_id, None)
+    lazy_expiry.schedule(session.session_id, time.time() + SESSION_TTL)
+    return stages
+
+async def wait_for_stages(session: LearningSession) -> LearningSession:
+    """Re-read a session while another worker is still streaming its stages in"""
+    deadline = time.monotonic() + STAGE_WAIT
+    while session.stages_pending and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        session = await sessions.get(session.session_id) or session
+    session.stages_pending = False  # If that worker gave up (or went away), generate them here
+    return session
+
+async def ensure_stage(session: LearningSession, stage: str) -> LearningSession:
+    """The session with a stage's content on it, waiting for streamed or lazy generation"""
+    task = session_tasks.get(session.session_id)
+    if task:
+        await asyncio.shield(task)
+        session = await sessions.get(session.session_id) or session
+    elif session.stages_pending:
+        session = await wait_for_stages(session)
+    
+    if get_stage(session, stage) is not None or not get_stage(session, "story"):
+        return session
+    
+    stages = lazy_sessions.get(session.session_id)
+    if not stages:
+        # Started on another worker - its API key stayed there, so these use the server's
+        stages = start_lazy_stages(session, None)
+    setattr(session, stage, await stages.get(stage))
+    await sessions.save(session)
+    if stage == "detective":
+        lazy_sessions.pop(session.session_id, None)
+        lazy_expiry.cancel(session.session_id)
+    return session
 
 @app.post("/api/session/{session_id}/complete-story")
 async def complete_story(session_id: str):
     """Mark story as complete and return quiz (already generated)"""
-    if session_id not in active_sessions:
+    session = await sessions.get(session_id)
+    if not session:
         return JSONResponse({"error": "Session not found"}, status_code=404)
     
-    session = active_sessions[session_id]
+    session = await ensure_stage(session, "quiz")
+    story = get_stage(session, "story")
+    
+    if not story or not get_stage(session, "quiz"):
+        return JSONResponse({"error": "Quiz not available"}, status_code=503)
     
-    if not session.story_completed:
+    if not session.story_completed and await sessions.claim(session_id, "story"):
         session.story_completed = True
-        add_xp(session.story.xp_reward, "Story completed")
+        add_xp(story.xp_reward, "Story completed")
         increment_stat("stories")
-        session.total_xp_earned += session.story.xp_reward
+        session.total_xp_earned += story.xp_reward
     
-    session.current_mode = "quiz"
+    # Still False if a concurrent request claimed the stage - its save must not be overwritten by this stale copy
+    if session.story_completed:
+        session.current_mode = "quiz"
+        await sessions.save(session)
+        session_history.progressed(session)
     
     # Quiz was already generated with the session
-    return {
+    return json_response({
         "story_complete": True,
-        "xp_earned": session.story.xp_reward,
-        "quiz": {
-            "questions": [
-                {"question": q.question, "options": q.options}
-                for q in session.quiz.questions
-            ],
-            "total_xp": session.quiz.total_xp
-        }
-    }
+        "xp_earned": story.xp_reward
+    }, quiz=session_payload(session, "quiz"))
 
 @app.post("/api/session/{session_id}/submit-quiz")
 async def submit_quiz(session_id: str, data: QuizAnswers):
     """Submit quiz answers and return master practice (already generated)"""
-    if session_id not in active_sessions:
+    session = await sessions.get(session_id)
+    if not session:
         return JSONResponse({"error": "Session not found"}, status_code=404)
     
-    session = active_sessions[session_id]
+    session = await ensure_stage(session, "quiz")
+    session = await ensure_stage(session, "master")
     
-    if not session.quiz:
+    quiz = get_stage(session, "quiz")
+    if not quiz or not get_stage(session, "master"):
         return JSONResponse({"error": "Quiz not available"}, status_code=400)
     
-    result = score_quiz(session.quiz, data.answers)
+    result = score_quiz(quiz, data.answers)
     
-    if not session.quiz_completed:
+    if not session.quiz_completed and await sessions.claim(session_id, "quiz"):
         session.quiz_completed = True
         add_xp(result["xp_earned"], "Quiz completed")
         increment_stat("quizzes")
@@ -176,69 +392,69 @@ async def submit_quiz(session_id: str, data: QuizAnswers):
         if result["percentage"] == 100:
             unlock_achievement("quiz_master")
     
-    session.current_mode = "master"
+    if session.quiz_completed:
+        session.current_mode = "master"
+        await sessions.save(session)
+        session_history.progressed(session)
     
     # Master was already generated with the session
-    return {
+    return json_response({
         **result,
-        "next_mode": "master",
-        "master": {
-            "questions": [
-                {"question": q.question, "options": q.options}
-                for q in session.master.questions
-            ],
-            "total_xp": session.master.total_xp
-        }
-    }
+        "next_mode": "master"
+    }, master=session_payload(session, "master"))
 
 @app.post("/api/session/{session_id}/submit-master")
 async def submit_master(session_id: str, data: MasterAnswers):
     """Submit master practice answers and return detective case (already generated)"""
-    if session_id not in active_sessions:
+    session = await sessions.get(session_id)
+    if not session:
         return JSONResponse({"error": "Session not found"}, status_code=404)
     
-    session = active_sessions[session_id]
+    session = await ensure_stage(session, "master")
+    session = await ensure_stage(session, "detective")
     
-    if not session.master:
+    master = get_stage(session, "master")
+    if not master or not get_stage(session, "detective"):
         return JSONResponse({"error": "Master practice not available"}, status_code=400)
     
-    result = score_master(session.master, data.answers)
+    result = score_master(master, data.answers)
     
-    if not session.master_completed:
+    if not session.master_completed and await sessions.claim(session_id, "master"):
         session.master_completed = True
         add_xp(result["xp_earned"], "Master practice completed")
         increment_stat("masters")
         session.total_xp_earned += result["xp_earned"]
     
-    session.current_mode = "detective"
+    if session.master_completed:
+        session.current_mode = "detective"
+        await sessions.save(session)
+        session_history.progressed(session)
+    
+    # The learner is on the last stage - get their next level ready in the background
+    speculate_next_level(session.topic)
     
     # Detective was already generated with the session
-    return {
+    return json_response({
         **result,
-        "next_mode": "detective",
-        "detective": {
-            "case_title": session.detective.case_title,
-            "scenario": session.detective.scenario,
-            "clues": [{"id": c.id, "description": c.description} for c in session.detective.clues],
-            "question": session.detective.question,
-            "xp_reward": session.detective.xp_reward
-        }
-    }
+        "next_mode": "detective"
+    }, detective=session_payload(session, "detective"))
 
 @app.post("/api/session/{session_id}/solve-case")
 async def solve_detective_case(session_id: str, data: DetectiveAnswer):
     """Submit detective case answer"""
-    if session_id not in active_sessions:
+    session = await sessions.get(session_id)
+    if not session:
         return JSONResponse({"error": "Session not found"}, status_code=404)
     
-    session = active_sessions[session_id]
+    session = await ensure_stage(session, "detective")
     
-    if not session.detective:
+    detective = get_stage(session, "detective")
+    if not detective:
         return JSONResponse({"error": "Detective case not available"}, status_code=400)
     
-    result = solve_case(session.detective, data.answer)
+    result = solve_case(detective, data.answer)
     
-    if not session.detective_completed:
+    if not session.detective_completed and await sessions.claim(session_id, "detective"):
         session.detective_completed = True
         add_xp(result["xp_earned"], "Detective case completed")
         increment_stat("cases")
@@ -246,6 +462,8 @@ async def solve_detective_case(session_id: str, data: DetectiveAnswer):
         
         if result["solved"]:
             unlock_achievement("detective")
+        await sessions.save(session)
+        session_history.progressed(session)
     
     return {
         **result,
@@ -256,10 +474,10 @@ async def solve_detective_case(session_id: str, data: DetectiveAnswer):
 @app.get("/api/session/{session_id}")
 async def get_session(session_id: str):
     """Get current session state"""
-    if session_id not in active_sessions:
+    session = await sessions.get(session_id)
+    if not session:
         return JSONResponse({"error": "Session not found"}, status_code=404)
     
-    session = active_sessions[session_id]
     return {
         "session_id": session.session_id,
         "topic": session.topic,
@@ -271,6 +489,144 @@ async def get_session(session_id: str):
         "total_xp_earned": session.total_xp_earned
     }
 
+# ==================== Generation Jobs ====================
+
+async def run_session_job(job: Job) -> dict:
+    """Generate a job's session - its result is usable once the story is in, the job is done when every stage is"""
+    current_client.set(job.client)
+    events = start_streamed_session(job.topic, job.api_key)
+    while True:
+        event, payload = await events.get()
+        if event == "story":
+            job.attach(payload)
+        elif event == "ready":
+            return {**job.result, "source": payload["source"]}
+        else:
+            return {"error": True, "message": payload["message"]}
+
+# Generations run on a bounded pool of background workers instead of inside HTTP requests
+generation_jobs = JobQueue(run_session_job)
+
+async def start_ready_session(topic: str, content: dict, api_key: Optional[str]) -> dict:
+    """Session on content that's already there - the same payload a job's result carries"""
+    session = new_session(str(uuid.uuid4())[:8], topic, content)
+    await sessions.save(session)
+    session_history.created(session)
+    if not get_stage(session, "quiz"):
+        start_lazy_stages(session, api_key)
+    return {
+        "session_id": session.session_id,
+        "topic": topic,
+        "ai_generated": True,
+        "source": content["source"],
+        "story": story_view(get_stage(session, "story"))
+    }
+
+@app.post("/api/session/jobs", status_code=202)
+async def start_session_job(data: TopicRequest, request: Request):
+    """Queue a learning session's generation - returns at once with a job id to poll or subscribe to.
+
+    Featured quests and stored content need no model call, so their session comes back
+    straight away as {"status": "done", "result": ...} without taking a job worker. A next
+    level still being generated speculatively gets a job that waits for it.
+    """
+    ready = await get_ready_content(data.topic, wait=False)
+    if ready:
+        return JSONResponse({"status": "done", "result": await start_ready_session(data.topic, ready, data.api_key)})
+    
+    client = client_id(request)
+    rejected = reject_if_busy(data.topic, client, backlog=generation_jobs.backlog())
+    if rejected:
+        return rejected
+    
+    job = await generation_jobs.submit(data.topic, data.api_key, client)
+    return {
+        "job_id": job.job_id,
+        "status_url": f"/api/session/jobs/{job.job_id}",
+        "events_url": f"/api/session/jobs/{job.job_id}/events"
+    }
+
+@app.get("/api/session/jobs/{job_id}")
+async def get_session_job(job_id: str):
+    """Job status and latest progress message, plus the session once its story is ready"""
+    job = generation_jobs.get(job_id)
+    if job:
+        return generation_jobs.status(job)
+    # Accepted by another worker
+    status = await generation_jobs.load(job_id)
+    if not status:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return status
+
+@app.get("/api/session/jobs/{job_id}/events")
+async def session_job_events(job_id: str):
+    """A job's events (SSE): queued, running, progress, result (the session, once its story is ready), then done or failed"""
+    job = generation_jobs.get(job_id)
+    if not job and not await generation_jobs.load(job_id):
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    
+    async def event_stream():
+        if not job:
+            # Accepted by another worker - follow its row
+            async for event, payload in generation_jobs.follow(job_id):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            return
+        queue = generation_jobs.subscribe(job)
+        try:
+            while True:
+                event, payload = await queue.get()
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+                if event in ("done", "failed"):
+                    break
+        finally:
+            generation_jobs.unsubscribe(job, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ==================== Lifecycle ====================
+
+@app.on_event("startup")
+async def start_session_store():
+    """Restore sessions snapshotted by the previous process (memory store) in the background"""
+    await sessions.start()
+
+@app.on_event("startup")
+async def warm_topic_index():
+    """Index stored topics in the background so the first lookups don't wait for it"""
+    asyncio.create_task(sync_topic_index())
+
+@app.on_event("shutdown")
+async def stop_generation_jobs():
+    """Stop job workers before their LLM clients are closed"""
+    await generation_jobs.stop()
+
+@app.on_event("shutdown")
+async def stop_session_tasks():
+    """Stop streamed generations so their sessions are saved without a pending flag"""
+    tasks = list(session_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.on_event("shutdown")
+async def flush_session_history():
+    """Write buffered session history before the worker exits"""
+    await session_history.close()
+
+@app.on_event("shutdown")
+async def close_session_store():
+    """Snapshot live sessions (memory store) or close connections (Redis store)"""
+    await sessions.close()
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    """Close pooled LLM connections on graceful shutdown"""
+    await llm_clients.close_all()
+
 # ==================== Run ====================
 
 if __name__ == "__main__":
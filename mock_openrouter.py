@@ -0,0 +1,214 @@
+"""Mock OpenRouter - Local stand-in for the chat completions API, for load testing
+
+Serves templated quest JSON with configurable latency and failure injection per model:
+
+    python mock_openrouter.py --port 8001 [--profiles profiles.json] [--seed 42]
+    OPENROUTER_BASE_URL=http://127.0.0.1:8001/api/v1 OPENROUTER_API_KEY=mock python -m uvicorn main:app
+
+A profiles file maps model names ("*" is the default) to settings, e.g.
+    {"google/gemini-2.0-flash-exp:free": {"latency": {"lognormal": [4.0, 0.6]}, "rate_limit_rate": 0.2}}
+
+Latency is one of {"fixed": s}, {"uniform": [low, high]} or {"lognormal": [median, sigma]}.
+Failure rates are probabilities per request: timeout_rate (hang for hang_seconds),
+rate_limit_rate (429 with Retry-After: retry_after) and malformed_rate (broken JSON).
+"""
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_PROFILE = {
+    "latency": {"lognormal": [3.0, 0.5]},
+    "timeout_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "malformed_rate": 0.0,
+    "retry_after": 2,
+    "hang_seconds": 120,
+    "stream_chunk_chars": 40,
+}
+
+# Roughly how the free-tier models behave (Jan 2026)
+PROFILES = {
+    "*": DEFAULT_PROFILE,
+    "google/gemini-2.0-flash-exp:free": {"latency": {"lognormal": [4.0, 0.6]}, "rate_limit_rate": 0.15, "timeout_rate": 0.03},
+    "google/gemma-3-27b-it:free": {"latency": {"lognormal": [8.0, 0.5]}, "malformed_rate": 0.1},
+    "meta-llama/llama-3.3-70b-instruct:free": {"latency": {"lognormal": [12.0, 0.7]}, "timeout_rate": 0.05},
+}
+
+app = FastAPI(title="Mock OpenRouter")
+counters = {}
+
+def profile_for(model: str) -> dict:
+    return {**DEFAULT_PROFILE, **PROFILES.get("*", {}), **PROFILES.get(model, {})}
+
+def sample_latency(spec: dict) -> float:
+    if "fixed" in spec:
+        return spec["fixed"]
+    if "uniform" in spec:
+        return random.uniform(*spec["uniform"])
+    median, sigma = spec["lognormal"]
+    return random.lognormvariate(math.log(median), sigma)
+
+def count(model: str, outcome: str) -> None:
+    model_counts = counters.setdefault(model, {})
+    model_counts[outcome] = model_counts.get(outcome, 0) + 1
+
+# ==================== Quest Templates ====================
+
+def extract_topic(prompt: str) -> str:
+    match = re.search(r"about:?\s*(.+?)(?:\n|\. | using |$)", prompt)
+    return match.group(1).strip().rstrip(".") if match else "Science"
+
+def story_json(topic: str) -> dict:
+    return {
+        "title": f"The Secret of {topic}",
+        "content": f"Mira had always wondered about {topic}. " * 20,
+        "key_facts": [f"{topic} fact {i}" for i in range(1, 6)],
+    }
+
+def quiz_json(topic: str) -> dict:
+    return {"questions": [
+        {"question": f"Question {i} about {topic}?", "options": ["A", "B", "C", "D"], "correct_index": i % 4, "explanation": "Because."}
+        for i in range(1, 6)
+    ]}
+
+def master_json(topic: str) -> dict:
+    return {"questions": [
+        {"question": f"Advanced question {i} about {topic}?", "options": ["A", "B", "C", "D"], "correct_answer": "A", "explanation": "Because."}
+        for i in range(1, 4)
+    ]}
+
+def detective_json(topic: str) -> dict:
+    return {
+        "case_title": f"The {topic} Mystery",
+        "scenario": f"Something strange happened in the {topic} lab. Nobody can explain it.",
+        "clues": [{"id": i, "description": f"Clue {i}"} for i in range(1, 4)],
+        "question": "What happened?",
+        "options": ["A", "B", "C", "D"],
+        "correct_answer": "A",
+        "explanation": "The clues point to A.",
+    }
+
+def completion_text(prompt: str) -> str:
+    """Pick the template matching the generator prompt"""
+    topic = extract_topic(prompt)
+    if "storyteller" in prompt:
+        data = story_json(topic)
+    elif "multiple choice questions about:" in prompt:
+        data = quiz_json(topic)
+    elif "advanced multiple choice" in prompt:
+        data = master_json(topic)
+    elif "detective mystery" in prompt:
+        data = detective_json(topic)
+    else:
+        data = {"story": story_json(topic), "quiz": quiz_json(topic), "master": master_json(topic), "detective": detective_json(topic)}
+    return "```json\n" + json.dumps(data, indent=2) + "\n```"
+
+def malform(text: str) -> str:
+    """Break the JSON the way models do - truncated output"""
+    return text[:random.randint(len(text) // 3, len(text) - 10)]
+
+# ==================== API ====================
+
+@app.get("/api/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": m, "object": "model"} for m in PROFILES if m != "*"]}
+
+@app.get("/stats")
+async def stats():
+    return counters
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "unknown")
+    prompt = body["messages"][-1]["content"]
+    profile = profile_for(model)
+    roll = random.random()
+
+    if roll < profile["rate_limit_rate"]:
+        count(model, "rate_limited")
+        return JSONResponse(
+            {"error": {"message": "Rate limit exceeded: free-models-per-min", "code": 429}},
+            status_code=429,
+            headers={"Retry-After": str(profile["retry_after"])}
+        )
+    roll -= profile["rate_limit_rate"]
+
+    if roll < profile["timeout_rate"]:
+        count(model, "timeout")
+        await asyncio.sleep(profile["hang_seconds"])
+        return JSONResponse({"error": {"message": "Upstream timeout", "code": 504}}, status_code=504)
+    roll -= profile["timeout_rate"]
+
+    text = completion_text(prompt)
+    if roll < profile["malformed_rate"]:
+        count(model, "malformed")
+        text = malform(text)
+    else:
+        count(model, "ok")
+
+    latency = sample_latency(profile["latency"])
+    completion_id = f"mock-{int(time.time() * 1000)}-{random.randint(0, 9999)}"
+    usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4}
+
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(completion_id, model, text, latency, profile), media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": usage,
+    }
+
+async def stream_chunks(completion_id: str, model: str, text: str, latency: float, profile: dict):
+    """Spread the sampled latency: a quarter before the first token, the rest across chunks"""
+    size = profile["stream_chunk_chars"]
+    pieces = [text[i:i + size] for i in range(0, len(text), size)]
+    await asyncio.sleep(latency * 0.25)
+    per_chunk = latency * 0.75 / max(len(pieces), 1)
+
+    for piece in pieces:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(per_chunk)
+
+    done = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    yield f"data: {json.dumps(done)}\n\n"
+    yield "data: [DONE]\n\n"
+
+# ==================== Run ====================
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenRouter chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--profiles", help="JSON file of per-model latency/failure profiles")
+    parser.add_argument("--seed", type=int, help="Random seed for repeatable runs")
+    args = parser.parse_args()
+
+    if args.profiles:
+        with open(args.profiles, encoding="utf-8") as f:
+            PROFILES = json.load(f)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
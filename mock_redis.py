@@ -0,0 +1,134 @@
+"""Mock Redis - Local stand-in for a Redis-protocol server, for running several workers without installing Redis
+
+Speaks enough RESP for the session store (PING, AUTH, SELECT, GET, SET with EX/PX,
+DEL, EXISTS, EXPIRE, TTL, DBSIZE, FLUSHDB). Data lives in memory and is lost on exit.
+
+    python mock_redis.py --port 6379
+    SESSION_STORE=redis SESSION_STORE_URL=redis://127.0.0.1:6379/0 gunicorn main:app -w 4 -k uvicorn.workers.UvicornWorker
+"""
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+
+class RespError(str):
+    """An error reply, e.g. "ERR unknown command" """
+
+databases = defaultdict(dict)  # db number -> key -> (value, expires_at or None)
+
+def encode_reply(value) -> bytes:
+    if isinstance(value, RespError):
+        return f"-{value}\r\n".encode()
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        return b"+OK\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+async def read_command(reader: asyncio.StreamReader) -> list[bytes] | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()  # Inline command, e.g. "PING" typed into telnet
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+def lookup(db: dict, key: bytes):
+    entry = db.get(key)
+    if entry and entry[1] is not None and entry[1] <= time.time():
+        del db[key]
+        return None
+    return entry
+
+def execute(db: dict, name: str, args: list[bytes]):
+    if name == "PING":
+        return args[0] if args else "PONG"
+    if name == "GET":
+        entry = lookup(db, args[0])
+        return entry[0] if entry else None
+    if name == "SET":
+        expires_at = None
+        options = [arg.upper() for arg in args[2:]]
+        if b"EX" in options:
+            expires_at = time.time() + int(args[2 + options.index(b"EX") + 1])
+        elif b"PX" in options:
+            expires_at = time.time() + int(args[2 + options.index(b"PX") + 1]) / 1000
+        db[args[0]] = (args[1], expires_at)
+        return True
+    if name == "DEL":
+        return sum(1 for key in args if lookup(db, key) and db.pop(key))
+    if name == "EXISTS":
+        return sum(1 for key in args if lookup(db, key))
+    if name == "EXPIRE":
+        entry = lookup(db, args[0])
+        if not entry:
+            return 0
+        db[args[0]] = (entry[0], time.time() + int(args[1]))
+        return 1
+    if name == "TTL":
+        entry = lookup(db, args[0])
+        if not entry:
+            return -2
+        return -1 if entry[1] is None else int(entry[1] - time.time())
+    if name == "DBSIZE":
+        return len(db)
+    if name == "FLUSHDB":
+        db.clear()
+        return True
+    if name in ("AUTH", "CLIENT"):
+        return True
+    if name == "COMMAND":
+        return []
+    return RespError(f"ERR unknown command '{name.lower()}'")
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    db = databases[0]
+    try:
+        while True:
+            command = await read_command(reader)
+            if not command:
+                break
+            name, args = command[0].decode().upper(), command[1:]
+            if name == "QUIT":
+                writer.write(encode_reply(True))
+                break
+            if name == "SELECT":
+                db = databases[int(args[0])]
+                reply = True
+            else:
+                try:
+                    reply = execute(db, name, args)
+                except (IndexError, ValueError):
+                    reply = RespError(f"ERR wrong arguments for '{name.lower()}' command")
+            writer.write(encode_reply(reply))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host: str, port: int) -> None:
+    server = await asyncio.start_server(handle, host, port)
+    print(f"[MOCK REDIS] Listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Redis-protocol stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,137 @@
+"""Admission Control - Cap concurrent AI generations per worker, queueing the rest fairly across clients"""
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from modules.progress import report_progress
+
+MAX_ACTIVE = int(os.getenv("AI_MAX_CONCURRENT_GENERATIONS", "8"))      # Generations running at once (per worker)
+MAX_QUEUED = int(os.getenv("AI_GENERATION_QUEUE_SIZE", "32"))          # Waiting generations before new ones get a 429
+MAX_QUEUED_PER_CLIENT = int(os.getenv("AI_GENERATION_QUEUE_PER_CLIENT", "4"))
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))  # Proxies in front of the app that append to X-Forwarded-For
+WAIT_WINDOW = 200  # Recent queue waits kept for percentiles
+
+# Who a generation is for (client IP or similar), set by the route that starts it; tasks inherit it
+current_client: ContextVar[str] = ContextVar("current_client", default="anonymous")
+
+class AdmissionRejected(Exception):
+    """The generation queue is full - try again after retry_after seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Concurrency cap with a bounded wait queue served round-robin by client.
+
+    A client with many queued generations gets one turn per round, so a single
+    burst can't starve everyone else. Only model calls go through here - featured
+    quests and content store hits are answered before a slot is needed.
+    """
+
+    def __init__(self, max_active: int = MAX_ACTIVE, max_queued: int = MAX_QUEUED,
+                 max_per_client: int = MAX_QUEUED_PER_CLIENT):
+        self.max_active = max(max_active, 1)
+        self.max_queued = max_queued
+        self.max_per_client = max_per_client
+        self.active = 0
+        self.queued = 0
+        self.waiting = OrderedDict()  # client -> deque of futures; the first client is served next
+        self.waits = deque(maxlen=WAIT_WINDOW)
+        self.hold_seconds = 30.0      # Moving average of how long a generation keeps its slot
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0}
+
+    def would_reject(self, client: str = None) -> bool:
+        """Whether a generation for this client would get a 429 right now"""
+        client = client or current_client.get()
+        if self.active < self.max_active and not self.queued:
+            return False
+        return self.queued >= self.max_queued or len(self.waiting.get(client, ())) >= self.max_per_client
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot should free up, for the Retry-After header"""
+        rounds = (self.queued + 1) / self.max_active
+        return max(1, math.ceil(rounds * self.hold_seconds))
+
+    def reject(self) -> AdmissionRejected:
+        self.counters["rejected"] += 1
+        return AdmissionRejected(self.retry_after())
+
+    async def acquire(self, client: str) -> None:
+        if self.active < self.max_active and not self.queued:
+            self.active += 1
+            self.counters["admitted"] += 1
+            self.waits.append(0.0)
+            return
+        if self.would_reject(client):
+            raise self.reject()
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(client, deque()).append(future)
+        self.queued += 1
+        self.counters["queued"] += 1
+        report_progress(f"waiting for a free generation slot ({self.queued} queued)")
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self.discard(client, future)
+            else:
+                self.release()  # The slot was handed over just as we were cancelled
+            raise
+        self.counters["admitted"] += 1
+        self.waits.append(time.monotonic() - started)
+
+    def discard(self, client: str, future: asyncio.Future) -> None:
+        queue = self.waiting.get(client)
+        if queue and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self.waiting[client]
+
+    def release(self) -> None:
+        """Hand the slot to the next client in turn, or free it"""
+        while self.waiting:
+            client, queue = next(iter(self.waiting.items()))
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.waiting.move_to_end(client)
+            else:
+                del self.waiting[client]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, client: str = None):
+        """Hold a generation slot for the block; raises AdmissionRejected when the queue is full"""
+        await self.acquire(client or current_client.get())
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.hold_seconds = 0.8 * self.hold_seconds + 0.2 * (time.monotonic() - started)
+            self.release()
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+        return {
+            **self.counters,
+            "active": self.active,
+            "max_active": self.max_active,
+            "queue_depth": self.queued,
+            "max_queued": self.max_queued,
+            "clients_waiting": len(self.waiting),
+            "p50_wait_s": round(waits[len(waits) // 2], 2) if waits else None,
+            "p95_wait_s": round(waits[int(len(waits) * 0.95)], 2) if waits else None,
+            "avg_generation_s": round(self.hold_seconds, 1),
+        }
+
+admission = AdmissionController()
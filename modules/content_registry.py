@@ -0,0 +1,41 @@
+"""Content Registry - Resolve session content references to shared, read-only quest content"""
+from typing import Callable, Optional
+from gamification.models import ContentRef, LearningSession
+from modules.prebuilt_quests import get_featured_quest, quest_version
+
+def featured_ref(quest_id: str, level: int) -> ContentRef:
+    return ContentRef(content_id=f"featured:{quest_id}", level=level, version=quest_version(quest_id) or 1)
+
+def resolve_featured(quest_id: str, ref: ContentRef) -> Optional[dict]:
+    if ref.version != quest_version(quest_id):
+        return None  # The pack was edited since the session started - its answers may no longer line up
+    return get_featured_quest(quest_id, ref.level)
+
+class ContentRegistry:
+    """Content sources by reference kind (the part of content_id before ":").
+
+    Everything resolved is shared by every session pointing at it, so callers must not modify it.
+    """
+
+    def __init__(self):
+        self.sources: dict[str, Callable[[str, ContentRef], Optional[dict]]] = {}
+
+    def register(self, kind: str, resolver: Callable[[str, ContentRef], Optional[dict]]) -> None:
+        self.sources[kind] = resolver
+
+    def resolve(self, ref: ContentRef) -> Optional[dict]:
+        """{"story", "quiz", "master", "detective"} for a reference, or None if it no longer resolves"""
+        kind, _, name = ref.content_id.partition(":")
+        resolver = self.sources.get(kind)
+        return resolver(name, ref) if resolver else None
+
+registry = ContentRegistry()
+registry.register("featured", resolve_featured)
+
+def get_stage(session: LearningSession, stage: str):
+    """A session's stage content - its own copy, or the shared content it references"""
+    own = getattr(session, stage)
+    if own is not None or session.content is None:
+        return own
+    content = registry.resolve(session.content)
+    return content[stage] if content else None
@@ -1,27 +1,11 @@
 """Detective Mode - Mystery solving with learned knowledge"""
-import os
-import json
-import re
-import time
-from typing import List
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import List, Optional
 from gamification.models import DetectiveCase, Clue
+from modules.quest_parser import extract_json, build_detective
+from modules.model_router import complete
 
-# Load environment variables and configure OpenRouter
-load_dotenv()
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY")
-)
-
-MODEL = "google/gemini-2.0-flash-exp:free"
-
-def generate_detective_case(topic: str, key_facts: List[str]) -> DetectiveCase:
-    """Generate a mystery case that requires applying learned knowledge"""
-    
-    # Add delay to avoid rate limiting
-    time.sleep(1)
+async def generate_detective_case(topic: str, key_facts: List[str], user_api_key: str = None, fallback: bool = True) -> Optional[DetectiveCase]:
+    """Generate a mystery case that requires applying learned knowledge (None on failure when fallback=False)"""
     
     facts_text = ", ".join(key_facts[:3])
     
@@ -30,64 +14,25 @@ def generate_detective_case(topic: str, key_facts: List[str]) -> DetectiveCase:
 Return JSON only:
 {{"case_title":"Title","scenario":"2-3 sentence mystery","clues":[{{"id":1,"description":"Clue"}}],"question":"What's the answer?","options":["A","B","C","D"],"correct_answer":"A","explanation":"Why"}}"""
 
-    for attempt in range(2):
+    # Without a fallback the caller does its own retries
+    for attempt in range(2 if fallback else 1):
         try:
-            response = client.chat.completions.create(
-                model=MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800
-            )
-            
-            if not response or not response.choices:
-                raise ValueError("Empty response")
-            
-            text = response.choices[0].message.content
-            if not text:
-                raise ValueError("Empty content")
-            
-            text = text.strip()
-            
-            # Remove markdown
-            if "```" in text:
-                text = re.sub(r'```json?\s*', '', text)
-                text = re.sub(r'```', '', text)
-            
-            json_match = re.search(r'\{[\s\S]*\}', text)
-            if json_match:
-                text = json_match.group()
-            
-            data = json.loads(text)
-            
-            clues = [Clue(id=i+1, description=c.get("description", "Clue"), is_key_clue=True) 
-                     for i, c in enumerate(data.get("clues", [])[:4])]
-            
-            if not clues:
-                clues = [Clue(id=1, description="Use your knowledge", is_key_clue=True)]
-            
-            options = data.get("options", [])
-            question = data.get("question", "What is the solution?")
-            if options:
-                question += "\n\n" + "\n".join([f"{chr(65+i)}. {opt}" for i, opt in enumerate(options[:4])])
-            
-            return DetectiveCase(
-                topic=topic,
-                case_title=data.get("case_title", f"The {topic} Mystery"),
-                scenario=data.get("scenario", "A mystery awaits..."),
-                clues=clues,
-                question=question,
-                correct_answer=data.get("correct_answer", "A"),
-                explanation=data.get("explanation", "Great detective work!"),
-                xp_reward=100
-            )
-            
+            # Each attempt walks the router's model order
+            case = await complete(prompt, lambda text: build_detective(extract_json(text), topic), user_api_key, max_tokens=800)
+            if case:
+                return case
         except Exception as e:
             print(f"[DETECTIVE ATTEMPT {attempt+1}] {type(e).__name__}: {e}")
-            if attempt < 1:
-                time.sleep(2)
-                continue
+    
+    if not fallback:
+        return None
     
     # Fallback
     print(f"[DETECTIVE] Using fallback for {topic}")
+    return fallback_detective(topic)
+
+def fallback_detective(topic: str) -> DetectiveCase:
+    """Generic case used when generation fails"""
     return DetectiveCase(
         topic=topic,
         case_title=f"The {topic} Case",
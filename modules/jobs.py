@@ -0,0 +1,318 @@
+"""Jobs - Session generation on a bounded pool of background workers, with progress for polling or SSE"""
+import os
+import time
+import uuid
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from gamification.database import engine
+from gamification.models_db import GenerationJob
+from modules.progress import progress_listener
+
+JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "4"))     # Generations running at once (per gunicorn worker)
+JOB_TTL = float(os.getenv("AI_JOB_TTL", "600"))         # Seconds a finished job can still be polled
+JOB_SYNC_INTERVAL = float(os.getenv("AI_JOB_SYNC_MS", "250")) / 1000  # Job status writes to SQLite are batched this long
+MAX_JOB_EVENTS = 50  # Progress messages kept per job for late subscribers
+
+class Job:
+    """One session generation request and everything a client needs to follow it"""
+
+    def __init__(self, topic: str, api_key: Optional[str], client: str = "anonymous", on_change: Callable[["Job"], None] = None):
+        self.job_id = str(uuid.uuid4())[:8]
+        self.topic = topic
+        self.api_key = api_key
+        self.client = client
+        self.status = "queued"  # queued -> running -> done | failed
+        self.events = deque(maxlen=MAX_JOB_EVENTS)  # (event, payload) in the order they happened
+        self.subscribers = set()  # asyncio.Queue per open event stream
+        self.result = None        # Set as soon as it's usable, which can be before the job finishes
+        self.message = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.published = asyncio.Event()  # Set once the result is usable - the job's worker moves on then
+        self.on_change = on_change
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def emit(self, event: str, payload: dict) -> None:
+        self.events.append((event, payload))
+        for queue in self.subscribers:
+            queue.put_nowait((event, payload))
+        if self.on_change:
+            self.on_change(self)
+
+    def progress(self, message: str) -> None:
+        """Progress listener installed while the job runs (repeats, e.g. from a polling loop, are dropped)"""
+        if self.finished or (self.events and self.events[-1] == ("progress", {"message": message})):
+            return
+        self.emit("progress", {"message": message})
+
+    def attach(self, result: dict) -> None:
+        """Publish a usable result early, e.g. the session once its story is ready"""
+        self.result = result
+        self.emit("result", result)
+        self.published.set()
+
+    def finish(self, result: dict) -> None:
+        """Record the runner's result - an error dict fails the job"""
+        self.finished_at = time.time()
+        self.api_key = None  # Not kept beyond the generation
+        if result.get("error"):
+            self.status = "failed"
+            self.message = result.get("message", "AI generation unavailable. Please try one of our Featured Quests instead! 🎮")
+            self.emit("failed", {"message": self.message})
+        else:
+            self.status = "done"
+            self.result = result
+            self.emit("done", result)
+        self.published.set()
+
+class JobQueue:
+    """FIFO of generation jobs drained by a fixed number of worker tasks.
+
+    A worker takes the next job as soon as the current one publishes a usable result
+    (the session once its story is in); the rest of that job finishes in the background.
+    Jobs run on the worker that accepted them. Their status is also written to the
+    generation_jobs table (batched every JOB_SYNC_INTERVAL), so polls and event streams
+    that land on another worker are answered from there.
+    runner(job) returns the finished payload, or an {"error": True, "message": ...} dict.
+    """
+
+    def __init__(self, runner: Callable[[Job], Awaitable[dict]], workers: int = JOB_WORKERS, ttl: float = JOB_TTL):
+        self.runner = runner
+        self.worker_count = max(workers, 1)
+        self.ttl = ttl
+        self.jobs = {}          # job_id -> Job, pruned after the TTL
+        self.pending = deque()  # Queued jobs, oldest first
+        self.wakeup = None
+        self.workers = []
+        self.running = set()    # Job tasks, including those finishing after their worker moved on
+        self.dirty = {}         # job_id -> Job whose row needs writing
+        self.sync_wakeup = None
+        self.sync_task = None
+        self.counters = {"submitted": 0, "done": 0, "failed": 0}
+        self.run_seconds = deque(maxlen=50)
+
+    def start(self) -> None:
+        """Start the worker tasks (needs a running event loop)"""
+        if self.workers:
+            return
+        self.wakeup = asyncio.Condition()
+        self.sync_wakeup = asyncio.Event()
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.worker_count)]
+        self.sync_task = asyncio.create_task(self.sync())
+
+    async def stop(self) -> None:
+        tasks = self.workers + list(self.running) + ([self.sync_task] if self.sync_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.sync_task = None
+        await self.flush()  # Interrupted jobs are reported as failed to whoever polls next
+
+    async def submit(self, topic: str, api_key: Optional[str] = None, client: str = "anonymous") -> Job:
+        """Queue a generation and return at once"""
+        self.start()
+        self.prune()
+        job = Job(topic, api_key, client, on_change=self.mark)
+        self.jobs[job.job_id] = job
+        self.pending.append(job)
+        self.counters["submitted"] += 1
+        job.emit("queued", {"position": len(self.pending)})
+        await self.flush()  # The client's first poll may land on another worker
+        async with self.wakeup:
+            self.wakeup.notify()
+        return job
+
+    async def worker(self) -> None:
+        while True:
+            async with self.wakeup:
+                await self.wakeup.wait_for(lambda: self.pending)
+                job = self.pending.popleft()
+            for waiting in self.pending:
+                self.mark(waiting)  # Moved up the queue
+            task = asyncio.create_task(self.run(job))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+            await job.published.wait()
+
+    async def run(self, job: Job) -> None:
+        job.status = "running"
+        job.emit("running", {})
+        started = time.perf_counter()
+        token = progress_listener.set(job.progress)
+        try:
+            result = await self.runner(job)
+        except asyncio.CancelledError:
+            job.finish({"error": True, "message": "Generation was interrupted. Please try again."})
+            raise
+        except Exception as e:
+            print(f"[JOBS] Job {job.job_id} failed: {type(e).__name__}: {e}")
+            result = {"error": True}
+        finally:
+            progress_listener.reset(token)
+        job.finish(result)
+        self.counters[job.status] += 1
+        self.run_seconds.append(time.perf_counter() - started)
+
+    def backlog(self) -> int:
+        """Jobs waiting for a worker"""
+        return len(self.pending)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        """1-based place in the queue, or None once the job has started"""
+        try:
+            return self.pending.index(job) + 1
+        except ValueError:
+            return None
+
+    def mark(self, job: Job) -> None:
+        """Queue a job's row to be written with the next batch"""
+        self.dirty[job.job_id] = job
+        if self.sync_wakeup:
+            self.sync_wakeup.set()
+
+    async def sync(self) -> None:
+        while True:
+            await self.sync_wakeup.wait()
+            await asyncio.sleep(JOB_SYNC_INTERVAL)  # Let a burst of progress messages collapse into one write
+            self.sync_wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self.dirty:
+            return
+        rows = [self.row(job) for job in self.dirty.values()]
+        self.dirty = {}
+        try:
+            await asyncio.to_thread(write_jobs, rows, time.time() - self.ttl)
+        except Exception as e:
+            print(f"[JOBS] Writing {len(rows)} job rows failed: {type(e).__name__}: {e}")
+
+    def row(self, job: Job) -> dict:
+        status = self.status(job)
+        return {
+            "job_id": job.job_id,
+            "topic": job.topic,
+            "status": job.status,
+            "position": status["position"],
+            "progress": status["progress"],
+            "result": job.result,
+            "message": job.message,
+            "updated_at": time.time(),
+        }
+
+    async def load(self, job_id: str) -> Optional[dict]:
+        """Poll response for a job running on another worker, from its row"""
+        return await asyncio.to_thread(read_job, job_id)
+
+    async def follow(self, job_id: str, interval: float = 0.5) -> AsyncIterator[tuple[str, dict]]:
+        """(event, payload) for a job on another worker, derived from its row as it changes"""
+        last = {}
+        while True:
+            status = await self.load(job_id)
+            if not status:
+                yield "failed", {"message": "Generation was interrupted. Please try again."}
+                return
+            if status["status"] == "queued" and status["position"] != last.get("position"):
+                yield "queued", {"position": status["position"]}
+            if status["status"] != "queued" and last.get("status") in (None, "queued"):
+                yield "running", {}
+            if status["progress"] and status["progress"] != last.get("progress"):
+                yield "progress", {"message": status["progress"]}
+            if status.get("result") and not last.get("result"):
+                yield "result", status["result"]
+            if status["status"] == "done":
+                yield "done", status["result"]
+                return
+            if status["status"] == "failed":
+                yield "failed", {"message": status["message"]}
+                return
+            last = status
+            await asyncio.sleep(interval)
+
+    def status(self, job: Job) -> dict:
+        """Poll response for a job"""
+        progress = [payload["message"] for event, payload in job.events if event == "progress"]
+        status = {
+            "job_id": job.job_id,
+            "status": job.status,
+            "topic": job.topic,
+            "position": self.position(job),
+            "progress": progress[-1] if progress else None,
+        }
+        if job.result:
+            status["result"] = job.result
+        if job.status == "failed":
+            status["message"] = job.message
+        return status
+
+    def subscribe(self, job: Job) -> asyncio.Queue:
+        """Queue of (event, payload) for one event stream, starting with everything so far"""
+        queue = asyncio.Queue()
+        for event in job.events:
+            queue.put_nowait(event)
+        job.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, job: Job, queue: asyncio.Queue) -> None:
+        job.subscribers.discard(queue)
+
+    def prune(self) -> None:
+        """Forget finished jobs nobody has polled within the TTL"""
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def stats(self) -> dict:
+        runs = sorted(self.run_seconds)
+        return {
+            **self.counters,
+            "workers": self.worker_count,
+            "queued": self.backlog(),
+            "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+            "p50_run_s": round(runs[len(runs) // 2], 2) if runs else None,
+        }
+
+def write_jobs(rows: list[dict], expired_before: float) -> None:
+    """Upsert job rows and drop finished ones past the TTL, in one transaction"""
+    with engine.begin() as connection:
+        for row in rows:
+            connection.execute(insert(GenerationJob).values(**row).on_conflict_do_update(
+                index_elements=["job_id"], set_=row
+            ))
+        connection.execute(delete(GenerationJob).where(
+            GenerationJob.status.in_(("done", "failed")), GenerationJob.updated_at < expired_before
+        ))
+
+def read_job(job_id: str) -> Optional[dict]:
+    """A job's row in the same shape as JobQueue.status()"""
+    with engine.connect() as connection:
+        row = connection.execute(select(GenerationJob).where(GenerationJob.job_id == job_id)).first()
+    if not row:
+        return None
+    if row.status not in ("done", "failed") and row.updated_at < time.time() - JOB_TTL:
+        # Its worker went away without finishing it
+        return {"job_id": row.job_id, "status": "failed", "topic": row.topic, "position": None,
+                "progress": row.progress, "message": "Generation was interrupted. Please try again."}
+    status = {
+        "job_id": row.job_id,
+        "status": row.status,
+        "topic": row.topic,
+        "position": row.position if row.status == "queued" else None,
+        "progress": row.progress,
+    }
+    if row.result:
+        status["result"] = row.result
+    if row.status == "failed":
+        status["message"] = row.message
+    return status
@@ -0,0 +1,66 @@
+"""Lazy Stages - Generate quiz, master and detective one step ahead of the learner"""
+import asyncio
+from typing import List
+from modules.quiz_mode import generate_quiz
+from modules.master_mode import generate_master_practice
+from modules.detective_mode import generate_detective_case
+from modules.admission import admission, current_client, AdmissionRejected
+
+STAGE_ORDER = ["quiz", "master", "detective"]
+
+async def generate_stage(stage: str, topic: str, key_facts: List[str], user_api_key: str = None, fallback: bool = True):
+    """Generate a single stage from the story's key facts (None on failure when fallback=False)"""
+    if stage == "quiz":
+        return await generate_quiz(topic, key_facts, user_api_key=user_api_key, fallback=fallback)
+    if stage == "master":
+        return await generate_master_practice(topic, key_facts, user_api_key=user_api_key, fallback=fallback)
+    if stage == "detective":
+        return await generate_detective_case(topic, key_facts, user_api_key=user_api_key, fallback=fallback)
+    raise ValueError(f"Unknown stage: {stage}")
+
+def next_stage(stage: str) -> str | None:
+    """Stage that follows the given one, or None after detective"""
+    index = STAGE_ORDER.index(stage)
+    return STAGE_ORDER[index + 1] if index + 1 < len(STAGE_ORDER) else None
+
+class LazyStages:
+    """Per-session background generation of the stages after the story.
+    
+    Each stage is generated at most once; callers awaiting the same stage share the task.
+    Sessions abandoned after the story never pay for master or detective. Generation
+    takes an admission slot like any other model call, charged to the session's client.
+    """
+    
+    def __init__(self, topic: str, key_facts: List[str], user_api_key: str = None):
+        self.topic = topic
+        self.key_facts = key_facts
+        self.user_api_key = user_api_key
+        self.client = current_client.get()
+        self.tasks = {}
+    
+    def prefetch(self, stage: str) -> None:
+        """Start generating a stage in the background if it isn't already"""
+        if stage not in self.tasks:
+            print(f"[LAZY] Generating {stage} for: {self.topic}")
+            self.tasks[stage] = asyncio.create_task(self.generate(stage))
+    
+    async def generate(self, stage: str):
+        """The stage, or None if admission turned it away (it's started again the next time it's needed)"""
+        try:
+            async with admission.slot(self.client):
+                return await generate_stage(stage, self.topic, self.key_facts, self.user_api_key)
+        except AdmissionRejected:
+            print(f"[LAZY] No generation slot for {stage} of: {self.topic}")
+            self.tasks.pop(stage, None)
+            return None
+    
+    async def get(self, stage: str):
+        """Wait for a stage (starting it on demand) and prefetch the one after it - AdmissionRejected when busy"""
+        self.prefetch(stage)
+        result = await asyncio.shield(self.tasks[stage])
+        if result is None:
+            raise AdmissionRejected(admission.retry_after())
+        following = next_stage(stage)
+        if following:
+            self.prefetch(following)
+        return result
@@ -0,0 +1,137 @@
+"""LLM Client - Registry of long-lived, pooled OpenRouter clients shared by all generators"""
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+# Load environment variables and configure OpenRouter with LONG timeout
+load_dotenv()
+
+# Point at mock_openrouter.py (e.g. http://127.0.0.1:8001/api/v1) for load testing
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+REQUEST_TIMEOUT = httpx.Timeout(60.0, connect=10.0)  # 60 second timeout, 10 second connect
+
+# Connection pool per client (one client per API key)
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+USER_CLIENTS_MAX = int(os.getenv("LLM_USER_CLIENTS_MAX", "32"))  # LRU of user-supplied keys
+EVICTED_CLOSE_DELAY = 120  # Let in-flight requests on an evicted client finish first
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+USE_HTTP2 = HTTP2_AVAILABLE and os.getenv("LLM_HTTP2", "1") != "0"
+
+class ClientRegistry:
+    """Hands out one warm AsyncOpenAI client per API key instead of a new client per call"""
+
+    def __init__(self):
+        self.server_client = None
+        self.user_clients = OrderedDict()  # sha256(key) -> AsyncOpenAI, least recently used first
+        self.counters = {
+            "clients_created": 0,
+            "clients_reused": 0,
+            "clients_evicted": 0,
+            "requests": 0,
+            "connections_opened": 0,
+        }
+
+    def get(self, user_api_key: str = None) -> AsyncOpenAI | None:
+        """Get a client - tries server key first, then user key"""
+        # Try server key first (for judges), then user key as fallback
+        server_key = os.getenv("OPENROUTER_API_KEY")
+        if server_key:
+            if self.server_client is None:
+                self.server_client = self.create(server_key)
+            else:
+                self.counters["clients_reused"] += 1
+            return self.server_client
+
+        if not user_api_key:
+            return None
+
+        # Keys are only held in memory, indexed by hash
+        key_hash = hashlib.sha256(user_api_key.encode()).hexdigest()
+        client = self.user_clients.get(key_hash)
+        if client:
+            self.user_clients.move_to_end(key_hash)
+            self.counters["clients_reused"] += 1
+            return client
+
+        client = self.create(user_api_key)
+        self.user_clients[key_hash] = client
+        while len(self.user_clients) > USER_CLIENTS_MAX:
+            _, evicted = self.user_clients.popitem(last=False)
+            self.counters["clients_evicted"] += 1
+            self.close_later(evicted)
+        return client
+
+    def create(self, api_key: str) -> AsyncOpenAI:
+        """Build a client with its own keep-alive connection pool"""
+        self.counters["clients_created"] += 1
+        http_client = httpx.AsyncClient(
+            http2=USE_HTTP2,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [self.on_request]},
+        )
+        return AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=api_key,
+            timeout=REQUEST_TIMEOUT,
+            http_client=http_client
+        )
+
+    async def on_request(self, request: httpx.Request) -> None:
+        """Count requests, and (via httpcore's trace hook) how many needed a new connection"""
+        self.counters["requests"] += 1
+        request.extensions["trace"] = self.on_trace
+
+    async def on_trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.counters["connections_opened"] += 1
+
+    def close_later(self, client: AsyncOpenAI) -> None:
+        """Close an evicted client once requests already using it have had time to finish"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (e.g. at exit) - the pool is released with the client
+        loop.call_later(EVICTED_CLOSE_DELAY, lambda: loop.create_task(client.close()))
+
+    async def close_all(self) -> None:
+        """Close every pooled client (on shutdown)"""
+        clients = list(self.user_clients.values())
+        if self.server_client:
+            clients.append(self.server_client)
+        self.server_client = None
+        self.user_clients.clear()
+        for client in clients:
+            await client.close()
+
+    def stats(self) -> dict:
+        requests = self.counters["requests"]
+        reused = requests - self.counters["connections_opened"]
+        return {
+            **self.counters,
+            "user_clients": len(self.user_clients),
+            "connection_reuse_rate": round(reused / requests, 3) if requests else None,
+            "http2": USE_HTTP2,
+        }
+
+registry = ClientRegistry()
+
+def get_client(user_api_key: str = None) -> AsyncOpenAI | None:
+    """Get a pooled async OpenAI client - tries server key first, then user key"""
+    return registry.get(user_api_key)
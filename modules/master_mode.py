@@ -1,27 +1,11 @@
 """Master Mode - Advanced practice questions"""
-import os
-import json
-import re
-import time
-from typing import List
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import List, Optional
 from gamification.models import MasterPractice, MasterQuestion
+from modules.quest_parser import extract_json, build_master
+from modules.model_router import complete
 
-# Load environment variables and configure OpenRouter
-load_dotenv()
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY")
-)
-
-MODEL = "google/gemini-2.0-flash-exp:free"
-
-def generate_master_practice(topic: str, key_facts: List[str]) -> MasterPractice:
-    """Generate advanced practice questions"""
-    
-    # Add small delay to avoid rate limiting
-    time.sleep(1)
+async def generate_master_practice(topic: str, key_facts: List[str], user_api_key: str = None, fallback: bool = True) -> Optional[MasterPractice]:
+    """Generate advanced practice questions (None on failure when fallback=False)"""
     
     facts_text = "\n".join([f"- {fact}" for fact in key_facts[:3]])
     
@@ -32,61 +16,25 @@ Key facts: {facts_text}
 Return JSON only:
 {{"questions":[{{"question":"Q1?","options":["A","B","C","D"],"correct_answer":"A","explanation":"Why A"}}]}}"""
 
-    for attempt in range(2):
+    # Without a fallback the caller does its own retries
+    for attempt in range(2 if fallback else 1):
         try:
-            response = client.chat.completions.create(
-                model=MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1000
-            )
-            
-            if not response or not response.choices:
-                raise ValueError("Empty response")
-            
-            text = response.choices[0].message.content
-            if not text:
-                raise ValueError("Empty content")
-            
-            text = text.strip()
-            
-            # Remove markdown code blocks
-            if "```" in text:
-                text = re.sub(r'```json?\s*', '', text)
-                text = re.sub(r'```', '', text)
-            
-            # Extract JSON
-            json_match = re.search(r'\{[\s\S]*\}', text)
-            if json_match:
-                text = json_match.group()
-            
-            data = json.loads(text)
-            
-            questions = []
-            for q in data.get("questions", [])[:3]:
-                questions.append(MasterQuestion(
-                    question=q.get("question", "Question"),
-                    question_type="multiple_choice",
-                    options=q.get("options", ["A", "B", "C", "D"]),
-                    correct_answer=q.get("correct_answer", "A"),
-                    explanation=q.get("explanation", "Correct!"),
-                    xp_reward=20
-                ))
-            
-            if questions:
-                return MasterPractice(
-                    topic=topic,
-                    questions=questions,
-                    total_xp=len(questions) * 20 + 50
-                )
-            
+            # Each attempt walks the router's model order
+            master = await complete(prompt, lambda text: build_master(extract_json(text), topic), user_api_key, max_tokens=1000)
+            if master:
+                return master
         except Exception as e:
             print(f"[MASTER ATTEMPT {attempt+1}] {type(e).__name__}: {e}")
-            if attempt < 1:
-                time.sleep(2)
-                continue
+    
+    if not fallback:
+        return None
     
     # Fallback
     print(f"[MASTER] Using fallback for {topic}")
+    return fallback_master(topic)
+
+def fallback_master(topic: str) -> MasterPractice:
+    """Generic practice used when generation fails"""
     return MasterPractice(
         topic=topic,
         questions=[
@@ -0,0 +1,191 @@
+"""Model Router - Order model attempts by observed health, with per-model circuit breakers"""
+import os
+import time
+import json
+import asyncio
+from collections import deque
+from typing import Callable, TypeVar
+import httpx
+from openai import APITimeoutError, RateLimitError
+from modules.llm_client import get_client
+from modules.rate_limiter import rate_limiter, retry_after_seconds, RATE_LIMIT_MAX_WAIT
+
+# Models to try in order (free tier - Jan 2026)
+MODELS = [
+    "google/gemini-2.0-flash-exp:free",
+    "google/gemma-3-27b-it:free",
+    "meta-llama/llama-3.3-70b-instruct:free",
+]
+
+ROUTER_WINDOW = int(os.getenv("AI_ROUTER_WINDOW", "20"))             # Attempts remembered per model
+BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "3"))        # Consecutive failures that open the breaker
+BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "60"))     # Seconds before a half-open probe
+
+# Priors so a model with little history isn't judged on one attempt
+PRIOR_LATENCY = 10.0
+PRIOR_ATTEMPTS = 2
+PRIOR_SUCCESSES = 1
+
+OUTCOMES = ("ok", "timeout", "parse_error", "error")
+
+class ModelHealth:
+    """Rolling latency/outcome window and circuit breaker state for one model"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.attempts = deque(maxlen=ROUTER_WINDOW)  # (latency seconds, outcome)
+        self.consecutive_failures = 0
+        self.state = "closed"  # closed -> open -> half_open -> closed/open
+        self.opened_at = 0.0
+        self.probe_started = 0.0  # When the half-open probe was handed out
+        self.totals = {outcome: 0 for outcome in OUTCOMES}
+
+    def record(self, outcome: str, latency: float) -> None:
+        self.attempts.append((latency, outcome))
+        self.totals[outcome] += 1
+
+        if outcome == "ok":
+            self.consecutive_failures = 0
+            if self.state != "closed":
+                print(f"[ROUTER] Closing breaker for {self.model}")
+            self.state = "closed"
+            return
+
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= BREAKER_FAILURES:
+            if self.state != "open":
+                print(f"[ROUTER] Opening breaker for {self.model} after {self.consecutive_failures} failures")
+            self.state = "open"
+            self.opened_at = time.time()
+
+    def acquire(self) -> bool:
+        """Closed, or open long enough that this caller gets the single probe.
+
+        A probe that never reports back (the request succeeded on another model
+        first, or was cancelled) is handed out again after BREAKER_COOLDOWN.
+        """
+        if self.state == "closed":
+            return True
+        now = time.time()
+        if self.state == "open" and now - self.opened_at >= BREAKER_COOLDOWN:
+            self.state = "half_open"
+            self.probe_started = 0.0
+        if self.state == "half_open" and now - self.probe_started >= BREAKER_COOLDOWN:
+            self.probe_started = now
+            return True
+        return False
+
+    def breaker(self) -> str:
+        """Breaker state as acquire() would see it, without changing it"""
+        if self.state == "open" and time.time() - self.opened_at >= BREAKER_COOLDOWN:
+            return "half_open"
+        return self.state
+
+    def rate(self, outcome: str) -> float:
+        if not self.attempts:
+            return 0.0
+        return sum(1 for _, o in self.attempts if o == outcome) / len(self.attempts)
+
+    def expected_time(self) -> float:
+        """Expected seconds until a valid response: mean attempt latency / success rate"""
+        total_latency = PRIOR_LATENCY * PRIOR_ATTEMPTS + sum(latency for latency, _ in self.attempts)
+        attempts = PRIOR_ATTEMPTS + len(self.attempts)
+        successes = PRIOR_SUCCESSES + sum(1 for _, o in self.attempts if o == "ok")
+        return (total_latency / attempts) / (successes / attempts)
+
+    def snapshot(self) -> dict:
+        latencies = sorted(latency for latency, _ in self.attempts)
+        return {
+            "model": self.model,
+            "breaker": self.breaker(),
+            "expected_time_s": round(self.expected_time(), 2),
+            "p50_latency_s": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "max_latency_s": round(latencies[-1], 2) if latencies else None,
+            "success_rate": round(self.rate("ok"), 3),
+            "timeout_rate": round(self.rate("timeout"), 3),
+            "parse_failure_rate": round(self.rate("parse_error"), 3),
+            "window": len(self.attempts),
+            "totals": dict(self.totals),
+        }
+
+class ModelRouter:
+    """Chooses the order in which models are attempted"""
+
+    def __init__(self, models: list[str]):
+        self.models = list(models)
+        self.health = {model: ModelHealth(model) for model in models}
+
+    def ordered_models(self) -> list[str]:
+        """Models with a closed breaker (or this request's probe), fastest expected first.
+
+        Open models are left out unless no model is available at all, when
+        trying them beats failing outright.
+        """
+        available = [m for m in self.models if self.health[m].acquire()] or list(self.models)
+        # sorted() is stable, so with no history the configured order is kept
+        return sorted(available, key=lambda m: self.health[m].expected_time())
+
+    def record(self, model: str, outcome: str, latency: float) -> None:
+        if model not in self.health:
+            self.models.append(model)
+            self.health[model] = ModelHealth(model)
+        self.health[model].record(outcome, latency)
+
+    def snapshot(self) -> list[dict]:
+        """Per-model stats for monitoring, in attempt order - read-only, so polling it hands out no probes"""
+        order = sorted(self.models, key=lambda m: (self.health[m].breaker() == "open", self.health[m].expected_time()))
+        return [self.health[m].snapshot() for m in order]
+
+# Reorders MODELS by observed latency/failures and skips models with an open breaker
+router = ModelRouter(MODELS)
+
+T = TypeVar("T")
+
+async def complete(prompt: str, parse: Callable[[str], T | None], user_api_key: str = None, **options) -> T | None:
+    """Send a single-stage prompt down the router's model order until a response parses - None if none does.
+
+    A model whose request budget is used up is passed over for the next one, and
+    only waited for once every model has been tried, so parallel stage calls
+    spread across the models' rate limits instead of queueing on one.
+    """
+    api_client = get_client(user_api_key)
+    if not api_client:
+        raise ValueError("No API key available")
+    
+    attempts = [(model, 0.0) for model in router.ordered_models()]
+    for model, max_wait in attempts:
+        if not await rate_limiter.acquire(model, api_client.api_key, max_wait):
+            if not max_wait:
+                attempts.append((model, RATE_LIMIT_MAX_WAIT))
+            continue
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await api_client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                **options
+            )
+            text = response.choices[0].message.content if response and response.choices else None
+            result = parse(text) if text else None
+            outcome = "ok" if result else "parse_error"
+            if result:
+                return result
+            print(f"[ROUTER] {model} returned no usable content")
+        except json.JSONDecodeError as e:
+            print(f"[ROUTER] {model} returned invalid JSON: {e}")
+            outcome = "parse_error"
+        except (httpx.TimeoutException, APITimeoutError):
+            print(f"[ROUTER] {model} timed out")
+            outcome = "timeout"
+        except asyncio.CancelledError:
+            outcome = None
+            raise
+        except RateLimitError as e:
+            rate_limiter.block(model, api_client.api_key, retry_after_seconds(e))
+        except Exception as e:
+            print(f"[ROUTER] {model} failed: {type(e).__name__}: {e}")
+        finally:
+            if outcome:
+                router.record(model, outcome, time.perf_counter() - started)
+    return None
@@ -0,0 +1,74 @@
+"""Payloads - Learner-facing JSON for each stage (answers stripped), serialized once per featured quest level"""
+import os
+import json
+from functools import lru_cache
+from fastapi.responses import Response
+from gamification.models import ContentRef, LearningSession
+from modules.content_registry import registry, get_stage
+
+PAYLOAD_CACHE_SIZE = int(os.getenv("FEATURED_PAYLOAD_CACHE", "256"))  # Shared content stages kept as bytes
+
+# ==================== Stage Views ====================
+
+def story_view(story) -> dict:
+    return {"title": story.title, "content": story.content, "xp_reward": story.xp_reward}
+
+def quiz_view(quiz) -> dict:
+    return {
+        "questions": [{"question": q.question, "options": q.options} for q in quiz.questions],
+        "total_xp": quiz.total_xp
+    }
+
+def master_view(master) -> dict:
+    return {
+        "questions": [{"question": q.question, "options": q.options} for q in master.questions],
+        "total_xp": master.total_xp
+    }
+
+def detective_view(detective) -> dict:
+    return {
+        "case_title": detective.case_title,
+        "scenario": detective.scenario,
+        "clues": [{"id": c.id, "description": c.description} for c in detective.clues],
+        "question": detective.question,
+        "xp_reward": detective.xp_reward
+    }
+
+VIEWS = {
+    "story": story_view,
+    "quiz": quiz_view,
+    "master": master_view,
+    "detective": detective_view,
+}
+
+# ==================== Encoding ====================
+
+def encode(value) -> bytes:
+    """JSON bytes in the same form as FastAPI's JSONResponse"""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def stage_payload(stage: str, content) -> bytes:
+    return encode(VIEWS[stage](content))
+
+@lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def shared_payload(content_id: str, level: int, version: int, stage: str) -> bytes:
+    """A stage of shared content (e.g. a featured quest), serialized on first use and then served as-is"""
+    content = registry.resolve(ContentRef(content_id=content_id, level=level, version=version))
+    return stage_payload(stage, content[stage])
+
+def session_payload(session: LearningSession, stage: str) -> bytes:
+    """A session's stage as JSON - shared content is immutable, so its bytes are shared too"""
+    ref = session.content
+    if ref and getattr(session, stage) is None:
+        return shared_payload(ref.content_id, ref.level, ref.version, stage)
+    return stage_payload(stage, get_stage(session, stage))
+
+def json_response(fields: dict, **fragments: bytes) -> Response:
+    """A JSON object of fields plus already-serialized fragments, which are copied in without re-encoding"""
+    body = bytearray(encode(fields)[:-1])
+    for key, fragment in fragments.items():
+        if len(body) > 1:
+            body += b","
+        body += encode(key) + b":" + fragment
+    body += b"}"
+    return Response(content=bytes(body), media_type="application/json")
@@ -0,0 +1,110 @@
+"""Pipeline - Generate the story, then quiz, master and detective in parallel from its key facts"""
+import os
+import time
+import asyncio
+from collections import deque
+from typing import List
+from gamification.models import Story
+from modules.llm_client import get_client
+from modules.story_mode import generate_story
+from modules.quiz_mode import fallback_quiz
+from modules.master_mode import fallback_master
+from modules.detective_mode import fallback_detective
+from modules.lazy_stages import STAGE_ORDER, generate_stage
+from modules.progress import report_progress
+
+STAGE_ATTEMPTS = int(os.getenv("AI_PIPELINE_ATTEMPTS", "2"))  # Tries per stage before its fallback is used
+STAGE_WINDOW = 50  # Recent runs per stage kept for latency stats
+
+FALLBACKS = {
+    "quiz": fallback_quiz,
+    "master": fallback_master,
+    "detective": fallback_detective,
+}
+
+class StageStats:
+    """Rolling wall-clock latency and retry counts per pipeline stage"""
+
+    def __init__(self):
+        self.latencies = {stage: deque(maxlen=STAGE_WINDOW) for stage in ["story", *STAGE_ORDER]}
+        self.totals = {stage: {"ok": 0, "retried": 0, "failed": 0} for stage in self.latencies}
+
+    def record(self, stage: str, latency: float, attempts: int, ok: bool) -> None:
+        self.latencies[stage].append(latency)
+        self.totals[stage]["ok" if ok else "failed"] += 1
+        if attempts > 1:
+            self.totals[stage]["retried"] += 1
+
+    def snapshot(self) -> dict:
+        stats = {}
+        for stage, window in self.latencies.items():
+            latencies = sorted(window)
+            stats[stage] = {
+                "p50_latency_s": round(latencies[len(latencies) // 2], 2) if latencies else None,
+                "max_latency_s": round(latencies[-1], 2) if latencies else None,
+                "window": len(latencies),
+                "totals": dict(self.totals[stage]),
+            }
+        return stats
+
+stage_stats = StageStats()
+
+async def run_stage(stage: str, topic: str, key_facts: List[str], user_api_key: str = None):
+    """Generate one stage, retrying only that stage - None if every attempt failed"""
+    started = time.perf_counter()
+    result = None
+    attempt = 0
+    while result is None and attempt < STAGE_ATTEMPTS:
+        attempt += 1
+        report_progress(f"generating {stage}" + (f" (attempt {attempt}/{STAGE_ATTEMPTS})" if attempt > 1 else ""))
+        if stage == "story":
+            result = await generate_story(topic, user_api_key, fallback=False)
+        else:
+            result = await generate_stage(stage, topic, key_facts, user_api_key, fallback=False)
+        if result is None:
+            print(f"[PIPELINE] {stage} attempt {attempt}/{STAGE_ATTEMPTS} failed for: {topic}")
+
+    stage_stats.record(stage, time.perf_counter() - started, attempt, result is not None)
+    return result
+
+async def generate_pipeline_story(topic: str, user_api_key: str = None) -> Story | None:
+    """First pipeline step - the story whose key facts the other stages build on"""
+    return await run_stage("story", topic, [], user_api_key)
+
+async def generate_pipeline_stages(topic: str, story: Story, user_api_key: str = None) -> dict:
+    """Fan out quiz, master and detective at once; a failed stage gets its fallback, the others are kept"""
+    return await complete_stages(topic, {"success": True, "source": "ai (pipeline)", "story": story}, user_api_key)
+
+async def complete_stages(topic: str, content: dict, user_api_key: str = None) -> dict:
+    """Generate, in parallel, each stage content doesn't have yet from its story's key facts"""
+    stages = [stage for stage in STAGE_ORDER if not content.get(stage)]
+    results = await asyncio.gather(*(
+        run_stage(stage, topic, content["story"].key_facts, user_api_key) for stage in stages
+    ))
+
+    failed = []
+    for stage, result in zip(stages, results):
+        if result is None:
+            print(f"[PIPELINE] Using fallback {stage} for: {topic}")
+            failed.append(stage)
+            result = FALLBACKS[stage](topic)
+        content[stage] = result
+    if failed:
+        content["fallback_stages"] = failed
+    return content
+
+async def generate_pipeline(topic: str, user_api_key: str = None) -> dict:
+    """Story first, then the other three stages in parallel"""
+    if not get_client(user_api_key):
+        return {
+            "error": True,
+            "message": "No API key available. Please enter your OpenRouter API key for custom topics, or try a Featured Quest!"
+        }
+
+    story = await generate_pipeline_story(topic, user_api_key)
+    if not story:
+        return {
+            "error": True,
+            "message": "AI generation unavailable. Please try one of our Featured Quests instead! 🎮"
+        }
+    return await generate_pipeline_stages(topic, story, user_api_key)
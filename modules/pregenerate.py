@@ -0,0 +1,131 @@
+"""Batch Pre-generation - Fill the content store ahead of time from a file of topics
+
+Usage:
+    python -m modules.pregenerate topics.txt --levels 1-3 --concurrency 4 --report report.jsonl
+
+Each line of the topics file is a topic, optionally followed by "| <level>".
+Blank lines and lines starting with "#" are skipped. Topics already in the
+content store are skipped, so an interrupted run can simply be restarted.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from gamification.content_store import get_cached_content, topic_key
+from modules.prebuilt_quests import is_featured_quest
+from modules.unified_generator import generate_once
+from modules.admission import admission
+
+def read_topics(path: str, levels: list[int]) -> list[str]:
+    """Read the topics file, expanding each topic to the requested levels"""
+    topics = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "|" in line:
+                topic, level = line.rsplit("|", 1)
+                topic_levels = [int(level)]
+            else:
+                topic, topic_levels = line, levels
+            for level in topic_levels:
+                topics.append(level_topic(topic.strip(), level))
+    
+    # Same topic twice would only generate once anyway
+    return list(dict.fromkeys(topics))
+
+def level_topic(topic: str, level: int) -> str:
+    """Topic as the frontend requests it for a level (see startNextLevel in app.js)"""
+    return topic if level == 1 else f"{topic} (Level {level} - Advanced)"
+
+def parse_levels(spec: str) -> list[int]:
+    """Parse "1", "1-3" or "1,3" into a list of levels"""
+    if "-" in spec:
+        low, high = spec.split("-", 1)
+        return list(range(int(low), int(high) + 1))
+    return [int(level) for level in spec.split(",")]
+
+async def pregenerate_topic(topic: str, semaphore: asyncio.Semaphore, retries: int, force: bool) -> dict:
+    """Generate one topic into the content store, return its report row"""
+    if is_featured_quest(topic):
+        return {"topic": topic, "status": "featured"}
+    if not force and await asyncio.to_thread(get_cached_content, topic):
+        return {"topic": topic, "status": "cached"}
+    
+    async with semaphore:
+        for attempt in range(1, retries + 2):
+            started = time.perf_counter()
+            result = await generate_once(topic, topic_key(topic), skip_cache=force)
+            latency = round(time.perf_counter() - started, 2)
+            
+            # Canned fallback stages are never stored - retry, and report them if they persist
+            if result.get("success") and not result.get("fallback_stages"):
+                usage = result.get("usage") or {}
+                return {
+                    "topic": topic,
+                    "status": "generated" if result.get("source", "").startswith("ai") else "cached",
+                    "model": result.get("model"),
+                    "latency_s": latency,
+                    "attempts": attempt,
+                    "prompt_tokens": usage.get("prompt_tokens"),
+                    "completion_tokens": usage.get("completion_tokens"),
+                    "total_tokens": usage.get("total_tokens"),
+                }
+    
+    if result.get("fallback_stages"):
+        return {"topic": topic, "status": "incomplete", "attempts": retries + 1,
+                "error": f"Not stored, fallback content for: {', '.join(result['fallback_stages'])}"}
+    return {"topic": topic, "status": "failed", "attempts": retries + 1, "error": result.get("message")}
+
+async def run(topics: list[str], concurrency: int, retries: int, force: bool, report_path: str = None) -> list[dict]:
+    """Pre-generate all topics with bounded concurrency, writing report rows as they finish"""
+    semaphore = asyncio.Semaphore(concurrency)
+    # The semaphore already bounds this process - admission sized for a server worker would turn topics away
+    admission.max_active = max(admission.max_active, concurrency)
+    report = open(report_path, "a", encoding="utf-8") if report_path else None
+    rows = []
+    try:
+        tasks = [asyncio.create_task(pregenerate_topic(t, semaphore, retries, force)) for t in topics]
+        for done in asyncio.as_completed(tasks):
+            row = await done
+            rows.append(row)
+            print(f"[PREGEN] {len(rows)}/{len(topics)} {row['status']:<9} {row['topic']}"
+                  + (f" ({row['model']}, {row['latency_s']}s, {row['total_tokens']} tokens)" if row.get("model") else ""))
+            if report:
+                report.write(json.dumps(row) + "\n")
+                report.flush()
+    finally:
+        if report:
+            report.close()
+    return rows
+
+def summarize(rows: list[dict]) -> str:
+    """One-line totals for the end of a run"""
+    counts = {}
+    for row in rows:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    tokens = sum(row.get("total_tokens") or 0 for row in rows)
+    latencies = sorted(row["latency_s"] for row in rows if row.get("latency_s") is not None)
+    median = latencies[len(latencies) // 2] if latencies else 0
+    return f"{counts} | {tokens} tokens | median latency {median}s"
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate quests into the content store")
+    parser.add_argument("topics_file", help="File with one topic per line (optionally 'topic | level')")
+    parser.add_argument("--levels", default="1", help="Levels for topics without one, e.g. 1-3 (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Generations in flight at once (default: 4)")
+    parser.add_argument("--retries", type=int, default=1, help="Extra attempts for a failed topic (default: 1)")
+    parser.add_argument("--force", action="store_true", help="Regenerate topics already in the content store")
+    parser.add_argument("--report", help="Append a JSON line per topic to this file")
+    args = parser.parse_args(argv)
+    
+    topics = read_topics(args.topics_file, parse_levels(args.levels))
+    print(f"[PREGEN] {len(topics)} topics, concurrency {args.concurrency}")
+    rows = asyncio.run(run(topics, args.concurrency, args.retries, args.force, args.report))
+    print(f"[PREGEN] Done: {summarize(rows)}")
+    return 0 if all(row["status"] not in ("failed", "incomplete") for row in rows) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
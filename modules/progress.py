@@ -0,0 +1,12 @@
+"""Progress - Report what a generation is doing to whoever is waiting on it (e.g. a job's event stream)"""
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# Set by the job worker running a generation; tasks created inside it inherit the listener
+progress_listener: ContextVar[Optional[Callable[[str], None]]] = ContextVar("progress_listener", default=None)
+
+def report_progress(message: str) -> None:
+    """Send a progress message, e.g. "trying model 2/3", to the current listener (if any)"""
+    listener = progress_listener.get()
+    if listener:
+        listener(message)
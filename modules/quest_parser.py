@@ -0,0 +1,400 @@
+"""Quest Parser - Pull the JSON object out of model output, repair common defects, build quest models"""
+import json
+import re
+from typing import Optional
+from pydantic import ValidationError
+from gamification.models import Story, Quiz, QuizQuestion, MasterPractice, MasterQuestion, DetectiveCase, Clue
+
+# A well-formed string (one token, never looked inside), a bracket, a comma or a stray quote
+CLEAN_STRING = r'"[^"\\\n\r\t]*(?:\\.[^"\\\n\r\t]*)*"(?=\s*[,:}\]])'
+OUTSIDE_TOKENS = re.compile(CLEAN_STRING + r'|[{}\[\],"“”]')
+OUTSIDE_TOKENS_LITERALS = re.compile(CLEAN_STRING + r'|[{}\[\],"“”]|\b(?:True|False|None)\b')
+# Inside a string that needs repair
+STRING_TOKENS = re.compile(r'["\\\n\r\t”]')
+# A "{" that can open an object - a key (straight or curly quote) or "}" comes next, unlike "{section}" in prose
+OBJECT_START = re.compile(r'\{(?=\s*["“}])')
+NEXT_CHAR = re.compile(r'\s*(\S)')
+STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+MAX_CANDIDATES = 5  # "{" positions tried before giving up (prose can contain braces)
+STAGES = ["quiz", "master", "detective"]
+# "B", "b)", "B." or "B. Paris" - an answer given as the option's letter
+LETTER_ANSWER = re.compile(r'\s*([A-Ha-h])(?:\s*$|[.):]\s*(.*))', re.S)
+LETTER_PREFIX = re.compile(r'\s*[A-Ha-h][.)]\s+')
+
+decoder = json.JSONDecoder()
+
+def closes_string(text: str, pos: int) -> bool:
+    """Whether the quote at pos ends a string - it does when , : } or ] (or the end) follows"""
+    following = text[pos + 1:pos + 2]
+    if following in (",", ":", "}", "]", ""):
+        return True
+    if not following.isspace():
+        return False
+    following = NEXT_CHAR.match(text, pos + 1)
+    return not following or following.group(1) in ",:}]"
+
+def repair_json(text: str, start: int = 0) -> tuple[str, int] | None:
+    """Scan once from the bracket at text[start] to its match, fixing model defects on the way.
+
+    Fixes trailing commas, raw newlines/tabs inside strings, unescaped quotes inside
+    strings, curly quotes used as string delimiters and Python True/False/None.
+    Returns (repaired JSON text, end index) or None if the value never closes (truncated).
+    """
+    edits = []  # (position, characters replaced, replacement)
+    depth = 0
+    in_string = False
+    quote = '"'  # Character that opened the current string
+    comma = -1   # Last comma outside a string, dropped if only whitespace follows before } or ]
+    end = -1
+    pos = start
+    # Everything else is copied through untouched, so only look for literals if there may be some
+    outside_tokens = OUTSIDE_TOKENS_LITERALS if ("True" in text or "False" in text or "None" in text) else OUTSIDE_TOKENS
+
+    while True:
+        match = (STRING_TOKENS if in_string else outside_tokens).search(text, pos)
+        if not match:
+            break
+        pos = match.end()
+        token = match.group()
+
+        if in_string:
+            if token == "\\":
+                pos += 1  # Skip the escaped character
+            elif token in STRING_ESCAPES:
+                edits.append((match.start(), 1, STRING_ESCAPES[token]))
+            elif token == '"' or quote != '"':
+                if closes_string(text, match.start()):
+                    in_string = False
+                    if token != '"':
+                        edits.append((match.start(), 1, '"'))
+                else:
+                    edits.append((match.start(), 1, '\\"'))
+            continue
+
+        if len(token) > 1 and token[0] == '"':
+            comma = -1  # Well-formed string, nothing to fix
+        elif token in '"“”':
+            in_string = True
+            quote = token
+            comma = -1
+            if token != '"':
+                edits.append((match.start(), 1, '"'))
+        elif token in "{[":
+            depth += 1
+            comma = -1
+        elif token in "}]":
+            if comma >= 0 and not text[comma + 1:match.start()].strip():
+                edits.append((comma, 1, ""))
+            comma = -1
+            depth -= 1
+            if depth == 0:
+                end = pos
+                break
+        elif token == ",":
+            comma = match.start()
+        elif token in PYTHON_LITERALS:
+            edits.append((match.start(), len(token), PYTHON_LITERALS[token]))
+
+    if end < 0:
+        return None
+    if not edits:
+        return text[start:end], end
+
+    parts = []
+    copied = start
+    for edit_pos, length, replacement in edits:
+        parts.append(text[copied:edit_pos])
+        parts.append(replacement)
+        copied = edit_pos + length
+    parts.append(text[copied:end])
+    return "".join(parts), end
+
+def extract_json(text: str) -> dict:
+    """Parse the first top-level JSON object in model output (fences and chatter around it are ignored).
+
+    Well-formed objects are decoded straight from the text; only broken ones take the repair scan.
+    Raises json.JSONDecodeError, like json.loads, when no object can be recovered.
+    """
+    match = OBJECT_START.search(text)
+    for _ in range(MAX_CANDIDATES):
+        if not match:
+            break
+        start = match.start()
+        try:
+            data, _ = decoder.raw_decode(text, start)
+            return data
+        except json.JSONDecodeError:
+            pass
+
+        repaired = repair_json(text, start)
+        if repaired is None:
+            break  # Truncated - nothing after this point can close either
+        candidate, end = repaired
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            match = OBJECT_START.search(text, end)
+    raise json.JSONDecodeError("No JSON object found", text, 0)
+
+def loads_lenient(text: str):
+    """json.loads for one JSON value, falling back to the repair scan - None if it can't be recovered"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    start = len(text) - len(text.lstrip())
+    repaired = repair_json(text, start)
+    if repaired is None:
+        return None
+    try:
+        return json.loads(repaired[0])
+    except json.JSONDecodeError:
+        return None
+
+# ==================== Local Fixes ====================
+
+def option_key(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def clean_options(options) -> list[str]:
+    """Options as strings, without "A. " prefixes the UI adds itself (only if every option has one)"""
+    if not isinstance(options, list):
+        return []
+    options = [str(option).strip() for option in options if str(option).strip()]
+    if len(options) > 1 and all(
+        option[0].upper() == chr(65 + i) and LETTER_PREFIX.match(option) for i, option in enumerate(options)
+    ):
+        options = [LETTER_PREFIX.sub("", option, count=1) for option in options]
+    return options
+
+def dedupe_options(options: list[str]) -> list[str]:
+    """Drop options that repeat an earlier one (ignoring case and spacing)"""
+    seen = set()
+    unique = []
+    for option in options:
+        key = option_key(option)
+        if key not in seen:
+            seen.add(key)
+            unique.append(option)
+    return unique
+
+def numeric_answer(answer) -> Optional[int]:
+    """An answer given as a number (or a string of digits), else None"""
+    if isinstance(answer, bool):
+        return None
+    if isinstance(answer, (int, float)):
+        return int(answer)
+    if isinstance(answer, str) and answer.strip().isdigit():
+        return int(answer)
+    return None
+
+def index_base(answers: list[tuple]) -> int:
+    """1 if a question set's (answer, options) pairs count indexes from 1, else 0.
+
+    Counted from 1 when every numeric answer is within 1..n and at least one is n, which
+    can't be a 0-based index. A stray n in a set that also uses 0 stays unresolvable.
+    """
+    indexes = [(numeric_answer(answer), len(options)) for answer, options in answers]
+    indexes = [(index, count) for index, count in indexes if index is not None]
+    if any(index == count for index, count in indexes) and all(1 <= index <= count for index, count in indexes):
+        return 1
+    return 0
+
+def answer_option(answer, options: list[str], base: int = 0) -> Optional[str]:
+    """The option a correct_answer/correct_index refers to - by text, letter or index (counted from base) - or None"""
+    if isinstance(answer, bool):
+        return None
+    if isinstance(answer, (int, float)):
+        index = int(answer) - base
+        return options[index] if 0 <= index < len(options) else None
+    if not isinstance(answer, str) or not answer.strip():
+        return None
+
+    keys = [option_key(option) for option in options]
+    if option_key(answer) in keys:
+        return options[keys.index(option_key(answer))]
+    if answer.strip().isdigit():
+        return answer_option(int(answer), options, base)
+
+    letter = LETTER_ANSWER.match(answer)
+    if letter:
+        index = ord(letter.group(1).upper()) - 65
+        rest = letter.group(2)
+        if rest and option_key(rest) in keys:
+            return options[keys.index(option_key(rest))]
+        if index < len(options):
+            return options[index]
+    return None
+
+def fix_choice(options: list[str], answer, base: int = 0) -> Optional[tuple[list[str], str]]:
+    """(usable options, correct option) with repeats removed and the answer resolved - None if unfixable"""
+    correct = answer_option(answer, options, base)
+    options = dedupe_options(options)
+    if correct is None or len(options) < 2:
+        return None
+    keys = [option_key(option) for option in options]
+    return options, options[keys.index(option_key(correct))]
+
+# ==================== Model Builders ====================
+
+def items(data, key: str, limit: int) -> list:
+    """data[key] if it's a list of objects, capped at limit"""
+    value = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(value, list):
+        return []
+    return [item for item in value if isinstance(item, dict)][:limit]
+
+def build_story(data: dict, topic: str) -> Optional[Story]:
+    """Story from a parsed story object - None if it has no text"""
+    if not isinstance(data, dict) or not data.get("content"):
+        return None
+
+    key_facts = data.get("key_facts")
+    if not isinstance(key_facts, list) or len(key_facts) < 3:
+        key_facts = [
+            f"{topic} is a fascinating subject",
+            f"There are many aspects to {topic}",
+            f"Understanding {topic} opens new perspectives",
+            f"{topic} has real-world applications",
+            f"Learning about {topic} is rewarding"
+        ]
+
+    try:
+        return Story(
+            topic=topic,
+            title=data.get("title") or f"Learning About {topic}",
+            content=data["content"],
+            key_facts=[str(fact) for fact in key_facts[:5]],
+            xp_reward=15
+        )
+    except ValidationError:
+        return None
+
+def build_quiz(data: dict, topic: str, limit: int = 5) -> Optional[Quiz]:
+    """Quiz from a parsed {"questions": [...]} object - None if no question is usable"""
+    listed = [(q, clean_options(q.get("options")), q.get("correct_index", q.get("correct_answer")))
+              for q in items(data, "questions", limit)]
+    base = index_base([(answer, options) for _, options, answer in listed])
+    questions = []
+    for q, options, answer in listed:
+        fixed = fix_choice(options, answer, base)
+        if not fixed or not q.get("question"):
+            continue
+        options, correct = fixed
+        try:
+            questions.append(QuizQuestion(
+                question=q["question"],
+                options=options,
+                correct_index=options.index(correct),
+                explanation=q.get("explanation", "Correct!")
+            ))
+        except ValidationError:
+            continue
+
+    if not questions:
+        return None
+    return Quiz(
+        topic=topic,
+        questions=questions,
+        difficulty="basic",
+        total_xp=len(questions) * 10 + 20
+    )
+
+def build_master(data: dict, topic: str, limit: int = 3) -> Optional[MasterPractice]:
+    """Master practice from a parsed {"questions": [...]} object - None if no question is usable"""
+    listed = [(q, clean_options(q.get("options")), q.get("correct_answer")) for q in items(data, "questions", limit)]
+    base = index_base([(answer, options) for _, options, answer in listed])
+    questions = []
+    for q, options, answer in listed:
+        # The UI submits the chosen option's text, so the answer must be one of the options
+        fixed = fix_choice(options, answer, base)
+        if not fixed or not q.get("question"):
+            continue
+        options, correct = fixed
+        try:
+            questions.append(MasterQuestion(
+                question=q["question"],
+                question_type="multiple_choice",
+                options=options,
+                correct_answer=correct,
+                explanation=q.get("explanation", "Correct!"),
+                xp_reward=20
+            ))
+        except ValidationError:
+            continue
+
+    if not questions:
+        return None
+    return MasterPractice(
+        topic=topic,
+        questions=questions,
+        total_xp=len(questions) * 20 + 50
+    )
+
+def build_detective(data: dict, topic: str) -> Optional[DetectiveCase]:
+    """Detective case from a parsed case object - None without clues"""
+    if not isinstance(data, dict):
+        return None
+    clues = [Clue(id=i+1, description=str(c.get("description", "Clue")), is_key_clue=True)
+             for i, c in enumerate(items(data, "clues", 4))]
+    if not clues:
+        return None
+
+    options = dedupe_options(clean_options(data.get("options")))[:4]
+    question = str(data.get("question") or "Solve the mystery")
+    correct_answer = data.get("correct_answer", "A")
+    if options:
+        question += "\n\n" + "\n".join([f"{chr(65+i)}. {opt}" for i, opt in enumerate(options)])
+        # "B. <option>" so solve_case accepts either the letter or the option's text
+        correct = answer_option(correct_answer, options, index_base([(correct_answer, options)]))
+        if correct:
+            correct_answer = f"{chr(65 + options.index(correct))}. {correct}"
+
+    try:
+        return DetectiveCase(
+            topic=topic,
+            case_title=data.get("case_title") or f"The {topic} Mystery",
+            scenario=data.get("scenario") or f"A mystery about {topic} awaits...",
+            clues=clues,
+            question=question,
+            correct_answer=str(correct_answer),
+            explanation=data.get("explanation", "Great detective work!"),
+            xp_reward=100
+        )
+    except ValidationError:
+        return None
+
+def build_sections(data: dict, topic: str) -> dict:
+    """Each stage of a unified response that is usable on its own - unusable stages are None"""
+    if not isinstance(data, dict):
+        data = {}
+    return {
+        "story": build_story(data.get("story"), topic),
+        "quiz": build_quiz(data.get("quiz"), topic),
+        "master": build_master(data.get("master"), topic),
+        "detective": build_detective(data.get("detective"), topic),
+    }
+
+def build_quest(data: dict, topic: str) -> Optional[dict]:
+    """All four stages from a unified response - None if any stage is unusable"""
+    content = build_sections(data, topic)
+    if not all(content.values()):
+        return None
+    return content
+
+def missing_stages(content: dict) -> list[str]:
+    """Stages after the story that still need generating"""
+    return [stage for stage in STAGES if not content.get(stage)]
+
+def parse_quest(text: str, topic: str) -> Optional[dict]:
+    """Model output of a unified prompt -> {"story", "quiz", "master", "detective"}, or None without a story.
+
+    Stages that didn't survive parsing are None - see missing_stages().
+    """
+    try:
+        content = build_sections(extract_json(text), topic)
+    except json.JSONDecodeError as e:
+        print(f"[PARSE] Error: {e}")
+        return None
+    return content if content["story"] else None
@@ -1,23 +1,11 @@
 """Quiz Mode - Generate comprehension questions from story"""
-import os
-import json
-import re
-from typing import List
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import List, Optional
 from gamification.models import Quiz, QuizQuestion
+from modules.quest_parser import extract_json, build_quiz
+from modules.model_router import complete
 
-# Load environment variables and configure OpenRouter
-load_dotenv()
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY")
-)
-
-MODEL = "google/gemini-2.0-flash-exp:free"
-
-def generate_quiz(topic: str, key_facts: List[str], num_questions: int = 5) -> Quiz:
-    """Generate a quick test quiz based on the story"""
+async def generate_quiz(topic: str, key_facts: List[str], num_questions: int = 5, user_api_key: str = None, fallback: bool = True) -> Optional[Quiz]:
+    """Generate a quick test quiz based on the story (None on failure when fallback=False)"""
     
     facts_text = "\n".join([f"- {fact}" for fact in key_facts[:5]])
     
@@ -30,76 +18,43 @@ IMPORTANT: Return ONLY valid JSON in this exact format, nothing else:
 {{"questions": [{{"question": "Question text?", "options": ["A", "B", "C", "D"], "correct_index": 0, "explanation": "Why correct"}}]}}"""
 
     try:
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        if not response or not response.choices:
-            raise ValueError("Empty response")
-        
-        text = response.choices[0].message.content
-        if not text:
-            raise ValueError("Empty content")
-        
-        text = text.strip()
-        if text.startswith("```"):
-            text = re.sub(r'^```json?\s*\n?', '', text)
-            text = re.sub(r'\n?```\s*$', '', text)
-        
-        # Try to find JSON
-        json_match = re.search(r'\{[\s\S]*\}', text)
-        if json_match:
-            text = json_match.group()
-        
-        data = json.loads(text)
-        
-        questions = []
-        for q in data.get("questions", [])[:num_questions]:
-            questions.append(QuizQuestion(
-                question=q.get("question", "Question"),
-                options=q.get("options", ["A", "B", "C", "D"]),
-                correct_index=q.get("correct_index", 0),
-                explanation=q.get("explanation", "")
-            ))
-        
-        if not questions:
+        quiz = await complete(prompt, lambda text: build_quiz(extract_json(text), topic, limit=num_questions), user_api_key)
+        if not quiz:
             raise ValueError("No questions generated")
-        
-        return Quiz(
-            topic=topic,
-            questions=questions,
-            difficulty="basic",
-            total_xp=len(questions) * 10 + 20
-        )
+        return quiz
     except Exception as e:
         print(f"[QUIZ ERROR] {type(e).__name__}: {e}")
-        # Return fallback quiz
-        return Quiz(
-            topic=topic,
-            questions=[
-                QuizQuestion(
-                    question=f"What is a key aspect of {topic}?",
-                    options=["Understanding concepts", "Just memorizing", "Ignoring details", "Random guessing"],
-                    correct_index=0,
-                    explanation="Understanding concepts is key to learning!"
-                ),
-                QuizQuestion(
-                    question=f"Why is learning about {topic} valuable?",
-                    options=["It has practical applications", "It's not valuable", "Only for experts", "No reason"],
-                    correct_index=0,
-                    explanation="Knowledge has practical applications!"
-                ),
-                QuizQuestion(
-                    question=f"What helps in mastering {topic}?",
-                    options=["Practice and curiosity", "Avoiding study", "Giving up", "Not asking questions"],
-                    correct_index=0,
-                    explanation="Practice and curiosity are essential!"
-                )
-            ],
-            difficulty="basic",
-            total_xp=50
-        )
+        if not fallback:
+            return None
+        return fallback_quiz(topic)
+
+def fallback_quiz(topic: str) -> Quiz:
+    """Generic quiz used when generation fails"""
+    return Quiz(
+        topic=topic,
+        questions=[
+            QuizQuestion(
+                question=f"What is a key aspect of {topic}?",
+                options=["Understanding concepts", "Just memorizing", "Ignoring details", "Random guessing"],
+                correct_index=0,
+                explanation="Understanding concepts is key to learning!"
+            ),
+            QuizQuestion(
+                question=f"Why is learning about {topic} valuable?",
+                options=["It has practical applications", "It's not valuable", "Only for experts", "No reason"],
+                correct_index=0,
+                explanation="Knowledge has practical applications!"
+            ),
+            QuizQuestion(
+                question=f"What helps in mastering {topic}?",
+                options=["Practice and curiosity", "Avoiding study", "Giving up", "Not asking questions"],
+                correct_index=0,
+                explanation="Practice and curiosity are essential!"
+            )
+        ],
+        difficulty="basic",
+        total_xp=50
+    )
 
 def score_quiz(quiz: Quiz, answers: List[int]) -> dict:
     """Score quiz answers and calculate XP"""
@@ -0,0 +1,135 @@
+"""Rate Limiter - Token buckets for outbound LLM calls, per model and API key, shared by all workers via SQLite"""
+import os
+import time
+import asyncio
+import hashlib
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from gamification.database import SessionLocal
+from gamification.models_db import RateLimitBucket
+
+# OpenRouter's free tier allows about 20 requests a minute per model
+RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "20"))
+RATE_LIMIT_BURST = float(os.getenv("LLM_RATE_LIMIT_BURST", "5"))          # Bucket size
+RATE_LIMIT_MAX_WAIT = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", "30"))   # Give up on a model after this (seconds)
+DEFAULT_RETRY_AFTER = 5.0  # When a 429 carries no usable Retry-After
+
+class RateLimiter:
+    """Token bucket per (model, API key); a request only waits when its bucket is empty"""
+
+    def __init__(self, rpm: float = RATE_LIMIT_RPM, burst: float = RATE_LIMIT_BURST):
+        self.rate = rpm / 60.0  # Tokens per second
+        self.burst = burst
+        self.counters = {
+            "acquired": 0,
+            "waited": 0,
+            "wait_seconds": 0.0,
+            "gave_up": 0,
+            "throttled_429": 0,
+        }
+
+    def bucket_key(self, model: str, api_key: str) -> str:
+        key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+        return f"{model}|{key_hash}"
+
+    def try_take(self, key: str) -> float:
+        """Take a token if one is available; return 0, or the seconds until one will be"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.time()
+        db = SessionLocal()
+        try:
+            db.add(RateLimitBucket(bucket_key=key, tokens=self.burst - 1, updated_at=now, blocked_until=0.0))
+            try:
+                db.commit()
+                return 0.0
+            except IntegrityError:
+                db.rollback()
+
+            # Refill and take in one UPDATE so two workers can't spend the same token
+            refilled = func.min(self.burst, RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * self.rate)
+            taken = db.query(RateLimitBucket).filter(
+                RateLimitBucket.bucket_key == key,
+                RateLimitBucket.blocked_until <= now,
+                refilled >= 1
+            ).update({"tokens": refilled - 1, "updated_at": now}, synchronize_session=False)
+            db.commit()
+            if taken == 1:
+                return 0.0
+
+            row = db.get(RateLimitBucket, key)
+            if row.blocked_until > now:
+                return row.blocked_until - now
+            tokens = min(self.burst, row.tokens + (now - row.updated_at) * self.rate)
+            return max((1 - tokens) / self.rate, 0.01)
+        except Exception as e:
+            db.rollback()
+            print(f"[RATE LIMIT] Bucket check failed for {key}: {type(e).__name__}: {e}")
+            return 0.0  # Never block generation on a limiter error
+        finally:
+            db.close()
+
+    async def acquire(self, model: str, api_key: str, max_wait: float = RATE_LIMIT_MAX_WAIT) -> bool:
+        """Wait for a request slot; False if none frees up within max_wait seconds"""
+        key = self.bucket_key(model, api_key)
+        deadline = time.monotonic() + max_wait
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self.try_take, key)
+            if wait <= 0:
+                self.counters["acquired"] += 1
+                if waited:
+                    self.counters["waited"] += 1
+                    self.counters["wait_seconds"] += waited
+                return True
+
+            if time.monotonic() + wait > deadline:
+                self.counters["gave_up"] += 1
+                print(f"[RATE LIMIT] {model} budget exhausted for {wait:.1f}s, not waiting")
+                return False
+
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def block(self, model: str, api_key: str, retry_after: float) -> None:
+        """Hold the bucket closed for retry_after seconds (after a 429)"""
+        key = self.bucket_key(model, api_key)
+        now = time.time()
+        self.counters["throttled_429"] += 1
+        print(f"[RATE LIMIT] {model} returned 429, backing off {retry_after:.1f}s")
+        db = SessionLocal()
+        try:
+            row = db.get(RateLimitBucket, key)
+            if not row:
+                row = RateLimitBucket(bucket_key=key, blocked_until=0.0)
+                db.add(row)
+            # One request may go out as soon as the block lifts, then the normal rate applies
+            row.tokens = 1.0
+            row.updated_at = now + retry_after
+            row.blocked_until = max(row.blocked_until or 0.0, now + retry_after)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[RATE LIMIT] Block failed for {key}: {type(e).__name__}: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "wait_seconds": round(self.counters["wait_seconds"], 2),
+            "rpm": self.rate * 60,
+            "burst": self.burst,
+        }
+
+def retry_after_seconds(error: Exception) -> float:
+    """Seconds to back off after a 429, from its Retry-After header when present"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,80 @@
+"""Speculative Generation - Pre-generate a custom quest's next level before it's requested"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from gamification.content_store import normalize_topic, topic_key
+
+MAX_LEVEL = 3  # Matches maxLevel in static/js/app.js
+SPECULATIVE_MAX_ENTRIES = int(os.getenv("AI_SPECULATIVE_MAX_ENTRIES", "100"))
+SPECULATIVE_TTL = float(os.getenv("AI_SPECULATIVE_TTL", "3600"))  # Unused results are dropped after this
+
+def next_level_topic(topic: str) -> str | None:
+    """Topic startNextLevel() will request after this one, or None at the last level"""
+    _, level = normalize_topic(topic)
+    if level >= MAX_LEVEL:
+        return None
+    base_topic = topic.split("(")[0].strip()
+    return f"{base_topic} (Level {level + 1} - Advanced)"
+
+class SpeculativeCache:
+    """Bounded cache of speculative generation tasks, keyed like the content store"""
+    
+    def __init__(self, max_entries: int = SPECULATIVE_MAX_ENTRIES, ttl: float = SPECULATIVE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # topic key -> (started_at, task)
+        self.counters = {"started": 0, "hits": 0, "failed": 0, "evicted_unused": 0}
+    
+    def start(self, topic: str, start_generation) -> None:
+        """Start a speculative generation; start_generation() must return an asyncio.Task"""
+        self.evict()
+        key = topic_key(topic)
+        if key in self.entries:
+            return
+        
+        print(f"[SPECULATIVE] Pre-generating: {topic}")
+        self.entries[key] = (time.time(), start_generation())
+        self.counters["started"] += 1
+        
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters["evicted_unused"] += 1
+    
+    async def take(self, topic: str, wait: bool = True) -> dict | None:
+        """Claim the speculative result for a topic - waiting if it's still generating, unless wait=False,
+        which leaves an unfinished one for a later take()"""
+        self.evict()
+        key = topic_key(topic)
+        entry = self.entries.get(key)
+        if not entry or (not wait and not entry[1].done()):
+            return None
+        del self.entries[key]
+        
+        result = await asyncio.shield(entry[1])
+        if not result.get("success"):
+            self.counters["failed"] += 1
+            return None
+        self.counters["hits"] += 1
+        return result
+    
+    def generating(self, topic: str) -> bool:
+        """True while a speculative generation for the topic is still running"""
+        entry = self.entries.get(topic_key(topic))
+        return bool(entry) and not entry[1].done()
+    
+    def evict(self) -> None:
+        """Drop results nobody claimed within the TTL"""
+        cutoff = time.time() - self.ttl
+        while self.entries:
+            started_at, _ = next(iter(self.entries.values()))
+            if started_at >= cutoff:
+                break
+            self.entries.popitem(last=False)
+            self.counters["evicted_unused"] += 1
+    
+    def stats(self) -> dict:
+        """Counters plus the number of results waiting to be claimed"""
+        return {**self.counters, "pending": len(self.entries)}
+
+speculative_cache = SpeculativeCache()
@@ -0,0 +1,61 @@
+"""Stream Parser - Pull finished sections out of a streamed JSON response"""
+from modules.quest_parser import loads_lenient
+
+
+class SectionStreamParser:
+    """Incrementally scan streamed model output for top-level JSON sections.
+
+    feed() returns each top-level object/array value (e.g. "story") as soon as
+    its closing bracket arrives, so the story can be shown while the model is
+    still writing the quiz, master and detective sections.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0            # Next character to scan
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_start = 0
+        self.key = None         # Last string seen at depth 1 (the current section name)
+        self.value_start = None # Where the current section's value began
+        self.sections = {}
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        """Add a chunk of model output, return newly completed (name, value) sections"""
+        self.text += chunk
+        text = self.text
+        completed = []
+
+        for i in range(self.pos, len(text)):
+            ch = text[i]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.key = text[self.string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch in "{[":
+                self.depth += 1
+                if self.depth == 2:
+                    self.value_start = i
+            elif ch in "}]" and self.depth > 0:
+                if self.depth == 2 and self.value_start is not None:
+                    value = loads_lenient(text[self.value_start:i + 1])
+                    if value is not None and self.key:
+                        self.sections[self.key] = value
+                        completed.append((self.key, value))
+                    self.value_start = None
+                self.depth -= 1
+
+        self.pos = len(text)
+        return completed
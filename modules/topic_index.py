@@ -0,0 +1,210 @@
+"""Topic Index - Canonical topics and a MinHash/LSH index for near-duplicate content store lookups"""
+import os
+import re
+import time
+import heapq
+from array import array
+from hashlib import blake2b
+from operator import eq
+from gamification.content_store import normalize_topic, list_content_keys
+
+MATCH_THRESHOLD = float(os.getenv("AI_TOPIC_MATCH_THRESHOLD", "0.6"))  # Estimated Jaccard similarity for a hit
+REFRESH_INTERVAL = float(os.getenv("AI_TOPIC_INDEX_REFRESH", "15"))    # Seconds between content store syncs
+
+# 8 bands of 4 rows: ~90% chance to surface a 0.7-similar topic, ~40% at 0.5
+BANDS = 8
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+SHINGLE = 3
+
+# Words that change how a topic is asked, not what it is about
+STOP_WORDS = frozenset("""
+a an the and or of in on at to for with by from into about as is are was were be been being
+how what why when where who which does do did can could would should will
+work works working explain explained explanation describe learn learning study studying
+introduction intro basics basic beginner beginners guide overview understand understanding
+tell me us teach i we you it its their this that these those
+""".split())
+
+# Roman numerals up to 39 ("ii", "xiv") - "World War II" and "World War I" are different topics
+ROMAN_NUMERAL = re.compile(r"x{0,3}(ix|iv|v?i{0,3})")
+
+# An LSH candidate is only served if its content words are this close (exact Jaccard) -
+# the MinHash estimate over character shingles can't tell "fusion" from "fission"
+WORD_MATCH = 0.85
+MAX_SCORED = 24     # Candidates whose signatures are compared, those sharing the most bands first
+MAX_VERIFIED = 8    # Candidates above the threshold checked word by word, most similar first
+BUCKET_LIMIT = 32   # Entries per LSH bucket; a bucket that full says little about similarity
+
+def analyze(normalized: str) -> tuple[frozenset, frozenset]:
+    """Content words (stop words dropped, plurals stemmed) and distinguishing tokens of a normalized topic.
+
+    Distinguishing tokens are numbers, roman numerals and single letters, read before
+    stop words are dropped: "a" and "i" count when they follow a content word, as in
+    "vitamin a" or "world war i", but not in "what is a black hole".
+    """
+    words, tokens = set(), set()
+    previous = None
+    for word in normalized.split():
+        if len(word) == 1 or any(char.isdigit() for char in word) or ROMAN_NUMERAL.fullmatch(word):
+            if word not in STOP_WORDS or (previous and previous not in STOP_WORDS):
+                tokens.add(word)
+        previous = word
+        if word in STOP_WORDS:
+            continue
+        # Light plural stemming: "holes" -> "hole", but not "glass", "analysis" or "virus"
+        if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "is", "us")):
+            word = word[:-1]
+        words.add(word)
+    # A topic made only of stop words ("how it works") is kept as typed
+    return frozenset(words or normalized.split()), frozenset(tokens)
+
+def canonicalize(topic: str) -> tuple[str, int]:
+    """Reduce a topic to sorted content words, e.g. "How does photosynthesis work?" -> ("photosynthesis", 1)"""
+    normalized, level = normalize_topic(topic)
+    words, _ = analyze(normalized)
+    return " ".join(sorted(words)), level
+
+def same_topic(first: tuple[frozenset, frozenset], second: tuple[frozenset, frozenset]) -> bool:
+    """Whether two analyzed topics ask about the same thing: identical numbers/letters, nearly identical words"""
+    (first_words, first_tokens), (second_words, second_tokens) = first, second
+    if first_tokens != second_tokens:
+        return False
+    union = first_words | second_words
+    return not union or len(first_words & second_words) / len(union) >= WORD_MATCH
+
+def signature(canonical: str) -> array:
+    """MinHash signature of the topic's character shingles.
+
+    One 64-byte blake2b digest per shingle gives NUM_PERM independent 16-bit hashes,
+    so the per-permutation minimum is taken in C rather than a Python loop.
+    """
+    padded = f" {canonical} "
+    shingles = {padded[i:i + SHINGLE] for i in range(max(len(padded) - SHINGLE + 1, 1))}
+    digests = [array("H", blake2b(shingle.encode(), digest_size=NUM_PERM * 2).digest()) for shingle in shingles]
+    return array("H", map(min, zip(*digests)))
+
+def similarity(first: array, second: array) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(map(eq, first, second)) / NUM_PERM
+
+def prepare(key: str) -> tuple[int, array]:
+    """(level, signature) for a content store key"""
+    level_text, _, normalized = key.partition(":")
+    canonical, _ = canonicalize(normalized)
+    return int(level_text), signature(canonical)
+
+class TopicIndex:
+    """In-memory LSH index over the content store's topic keys (one per worker, synced from SQLite)"""
+
+    def __init__(self, threshold: float = MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.keys = []          # id -> content store key ("level:normalized"), None once removed
+        self.levels = array("H")
+        self.signatures = []    # id -> MinHash signature
+        self.ids = {}           # content store key -> id
+        self.buckets = {}       # hash(level, band, rows) -> id, or list of ids
+        self.synced_at = 0.0    # created_at of the newest content store row seen
+        self.refreshed = 0.0    # When the content store was last checked
+        self.counters = {"lookups": 0, "hits": 0, "candidates": 0}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def band_keys(self, level: int, sig: array) -> list[int]:
+        return [hash((level, band, sig[band * ROWS:(band + 1) * ROWS].tobytes())) for band in range(BANDS)]
+
+    def add(self, key: str) -> None:
+        """Index a content store key, e.g. "2:photosynthesis in plants" """
+        if key not in self.ids:
+            self.insert(key, *prepare(key))
+
+    def insert(self, key: str, level: int, sig: array) -> None:
+        entry = len(self.keys)
+        self.keys.append(key)
+        self.levels.append(level)
+        self.signatures.append(sig)
+        self.ids[key] = entry
+        for band_key in self.band_keys(level, sig):
+            bucket = self.buckets.get(band_key)
+            if bucket is None:
+                self.buckets[band_key] = entry
+            elif isinstance(bucket, list):
+                if len(bucket) < BUCKET_LIMIT:
+                    bucket.append(entry)
+            else:
+                self.buckets[band_key] = [bucket, entry]
+
+    def remove(self, key: str) -> None:
+        """Forget a key (e.g. evicted from the content store); its bucket slots are skipped from now on"""
+        entry = self.ids.pop(key, None)
+        if entry is not None:
+            self.keys[entry] = None
+
+    def lookup(self, topic: str) -> tuple[str, float] | None:
+        """Most similar indexed key at the same level that is the same topic word for word, as (key, similarity)
+
+        LSH buckets give the candidates and the MinHash estimate ranks them; at most
+        MAX_VERIFIED of those above the threshold are then checked with same_topic(),
+        so a lookup's cost is bounded however crowded its buckets are.
+        """
+        self.counters["lookups"] += 1
+        normalized, level = normalize_topic(topic)
+        query = analyze(normalized)
+        sig = signature(" ".join(sorted(query[0])))
+
+        # Entries sharing more bands with the query are likelier matches - only the top MAX_SCORED get scored
+        bands_shared = {}
+        for band_key in self.band_keys(level, sig):
+            bucket = self.buckets.get(band_key)
+            if bucket is None:
+                continue
+            for entry in (bucket if isinstance(bucket, list) else (bucket,)):
+                bands_shared[entry] = bands_shared.get(entry, 0) + 1
+        candidates = bands_shared if len(bands_shared) <= MAX_SCORED else heapq.nlargest(MAX_SCORED, bands_shared, key=bands_shared.get)
+
+        scored = []
+        for entry in candidates:
+            if self.keys[entry] is None or self.levels[entry] != level:
+                continue
+            score = similarity(sig, self.signatures[entry])
+            if score >= self.threshold:
+                scored.append((score, entry))
+
+        self.counters["candidates"] += len(bands_shared)
+        scored.sort(reverse=True)
+        for score, entry in scored[:MAX_VERIFIED]:
+            key = self.keys[entry]
+            if same_topic(query, analyze(key.partition(":")[2])):
+                self.counters["hits"] += 1
+                return key, score
+        return None
+
+    def due_for_refresh(self) -> bool:
+        """True at most once per REFRESH_INTERVAL - the caller then syncs with fetch_new/apply"""
+        now = time.time()
+        if now - self.refreshed < REFRESH_INTERVAL:
+            return False
+        self.refreshed = now
+        return True
+
+    def fetch_new(self) -> list[tuple[str, float, int, array]]:
+        """Content store keys saved since the last sync, with their signatures (blocking - run in a thread)"""
+        return [(key, created_at, *prepare(key)) for key, created_at in list_content_keys(since=self.synced_at)]
+
+    def apply(self, rows: list[tuple[str, float, int, array]]) -> None:
+        """Index rows from fetch_new (on the event loop, so lookups never see a half-added entry)"""
+        for key, created_at, level, sig in rows:
+            if key not in self.ids:
+                self.insert(key, level, sig)
+            self.synced_at = max(self.synced_at, created_at)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "topics": len(self.ids),
+            "buckets": len(self.buckets),
+            "threshold": self.threshold,
+        }
+
+topic_index = TopicIndex()
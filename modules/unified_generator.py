@@ -1,32 +1,122 @@
 """Unified Learning Generator - Hybrid content with multi-model fallback"""
 import os
-import json
-import re
 import time
+import socket
+import asyncio
 import httpx
-from dotenv import load_dotenv
-from openai import OpenAI
-from gamification.models import Story, Quiz, QuizQuestion, MasterPractice, MasterQuestion, DetectiveCase, Clue
+from openai import AsyncOpenAI, APITimeoutError, RateLimitError
+from gamification.content_store import get_cached_content, get_content_by_key, save_content, topic_key, acquire_lease, release_lease
 from modules.prebuilt_quests import is_featured_quest, get_featured_quest
+from modules.content_registry import featured_ref
+from modules.stream_parser import SectionStreamParser
+from modules.quest_parser import parse_quest, build_story, missing_stages
+from modules.speculative import speculative_cache, next_level_topic
+from modules.topic_index import topic_index
+from modules.model_router import MODELS, router
+from modules.llm_client import get_client
+from modules.rate_limiter import rate_limiter, retry_after_seconds
+from modules.progress import report_progress
+from modules.admission import admission, AdmissionRejected
+from modules.story_mode import generate_story
+from modules.pipeline import generate_pipeline, generate_pipeline_story, generate_pipeline_stages, complete_stages
 
-# Load environment variables and configure OpenRouter with LONG timeout
-load_dotenv()
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    timeout=httpx.Timeout(60.0, connect=10.0)  # 60 second timeout, 10 second connect
-)
-
-# Models to try in order (free tier - Jan 2026)
-MODELS = [
-    "google/gemini-2.0-flash-exp:free",
-    "google/gemma-3-27b-it:free",
-    "meta-llama/llama-3.3-70b-instruct:free",
-]
-
-def generate_all_content(topic: str, user_api_key: str = None) -> dict:
+# "unified" generates all four stages in one call; "lazy" generates only the story up
+# front and the later stages one step ahead of the learner (see modules/lazy_stages.py);
+# "pipeline" generates the story, then the other three stages in parallel (modules/pipeline.py)
+GENERATION_MODE = os.getenv("AI_GENERATION_MODE", "unified").lower()
+
+# Hedged requests: "serial" waits for each model to fail before trying the next,
+# "hedge" also starts the next model after AI_HEDGE_DELAY seconds without a valid
+# answer, and "race" starts every model at once. First valid response wins.
+HEDGE_MODE = os.getenv("AI_HEDGE_MODE", "hedge").lower()
+HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "10"))
+
+# Single-flight: identical topics generate once. Within a worker, callers share one
+# task; across gunicorn workers, a lease in SQLite elects the worker that generates
+# while the others poll the content store for its result.
+LEASE_TTL = float(os.getenv("AI_LEASE_TTL", "200"))  # Longer than a full serial fallback
+LEASE_POLL_INTERVAL = 0.5
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+inflight_generations: dict[str, asyncio.Task] = {}
+
+async def generate_all_content(topic: str, user_api_key: str = None) -> dict:
     """Generate all learning content - uses pre-built quests or AI with fallback"""
     
+    # Featured quest or previously generated content
+    ready = await get_ready_content(topic)
+    if ready:
+        return ready
+    
+    # Shield so one caller going away doesn't cancel everyone else's generation
+    return await asyncio.shield(start_generation(topic, user_api_key))
+
+
+def joinable_generation(topic: str, user_api_key: str = None) -> asyncio.Task | None:
+    """An identical generation in flight on this worker that this caller can share"""
+    task = inflight_generations.get(topic_key(topic))
+    if task and task.keyless and user_api_key:
+        return None  # It will fail with "No API key" - a caller with a key generates for itself
+    return task
+
+
+def start_generation(topic: str, user_api_key: str = None) -> asyncio.Task:
+    """Join an identical generation already in flight on this worker, or start one"""
+    task = joinable_generation(topic, user_api_key)
+    if task is None:
+        key = topic_key(topic)
+        task = asyncio.create_task(generate_once(topic, key, user_api_key))
+        task.keyless = get_client(user_api_key) is None
+        inflight_generations[key] = task
+        task.add_done_callback(lambda done: inflight_generations.pop(key) if inflight_generations.get(key) is done else None)
+    else:
+        print(f"[AI] Joining in-flight generation for: {topic}")
+        report_progress("joining an identical generation already in progress")
+    return task
+
+
+def speculate_next_level(topic: str) -> None:
+    """Start generating a custom quest's next level so "Next Level" is instant"""
+    next_topic = next_level_topic(topic)
+    if not next_topic or is_featured_quest(next_topic):
+        return
+    # Only the server key - we don't keep user keys beyond their request
+    if not os.getenv("OPENROUTER_API_KEY"):
+        return
+    speculative_cache.start(next_topic, lambda: start_generation(next_topic))
+
+
+async def generate_story_content(topic: str, user_api_key: str = None) -> dict:
+    """Lazy mode - return full content if it's ready, otherwise generate only the story"""
+    ready = await get_ready_content(topic)
+    if ready:
+        return ready
+    
+    if not get_client(user_api_key):
+        return {
+            "error": True,
+            "message": "No API key available. Please enter your OpenRouter API key for custom topics, or try a Featured Quest!"
+        }
+    
+    report_progress("writing the story")
+    try:
+        async with admission.slot():
+            story = await generate_story(topic, user_api_key, fallback=False)
+    except AdmissionRejected as e:
+        return busy_response(e)
+    if not story:
+        return {
+            "error": True,
+            "message": "AI generation unavailable. Please try one of our Featured Quests instead! 🎮"
+        }
+    return {"success": True, "source": "ai (lazy)", "story": story}
+
+
+async def get_ready_content(topic: str, wait: bool = True) -> dict | None:
+    """Return content that needs no model call - a featured quest or a content store hit.
+    
+    wait=False skips a speculative generation that's still running instead of waiting for it.
+    """
+    
     # Check if this matches a featured quest
     featured_match = is_featured_quest(topic)
     if featured_match:
@@ -36,35 +126,233 @@ def generate_all_content(topic: str, user_api_key: str = None) -> dict:
         return {
             "success": True,
             "source": f"prebuilt (Level {level})",
+            "content_ref": featured_ref(quest_id, level),  # Sessions can point at the shared copy
             "story": quest["story"],
             "quiz": quest["quiz"],
             "master": quest["master"],
             "detective": quest["detective"]
         }
     
-    # Try AI generation with multiple models
-    return generate_with_fallback(topic, user_api_key)
+    # Next level generated while the learner was still on the previous one
+    speculative = await speculative_cache.take(topic, wait)
+    if speculative:
+        print(f"[SPECULATIVE] Using pre-generated content for: {topic}")
+        return {**speculative, "source": "speculative"}
+    
+    # Reuse content generated earlier for the same topic (by any worker)
+    cached = await asyncio.to_thread(get_cached_content, topic)
+    if cached:
+        print(f"[CACHE] Using stored content for: {topic}")
+        return {"success": True, "source": "cache", **cached}
+    
+    # ...or for a near-duplicate of it ("how does photosynthesis work" -> "photosynthesis")
+    return await get_similar_content(topic)
+
+
+async def store_content(topic: str, content: dict) -> None:
+    """Save to the content store and make the topic findable by similar lookups on this worker"""
+    await asyncio.to_thread(save_content, topic, content)
+    topic_index.add(topic_key(topic))
+
 
+async def sync_topic_index() -> None:
+    """Pick up topics other workers (or this one) have saved since the last sync"""
+    if topic_index.due_for_refresh():
+        topic_index.apply(await asyncio.to_thread(topic_index.fetch_new))
 
-def get_client(user_api_key: str = None):
-    """Get OpenAI client - tries server key first, then user key"""
-    # Try server key first (for judges), then user key as fallback
-    server_key = os.getenv("OPENROUTER_API_KEY")
-    api_key = server_key or user_api_key
+
+async def get_similar_content(topic: str) -> dict | None:
+    """Content store hit for the most similar stored topic at the same level, if similar enough"""
+    await sync_topic_index()
+    match = topic_index.lookup(topic)
+    if not match:
+        return None
     
-    if not api_key:
+    key, score = match
+    if key == topic_key(topic):
+        return None  # The exact key just missed - it has expired
+    cached = await asyncio.to_thread(get_content_by_key, key)
+    if not cached:
+        topic_index.remove(key)  # Expired or evicted since it was indexed
         return None
-    return OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-        timeout=httpx.Timeout(60.0, connect=10.0)
-    )
+    print(f"[CACHE] Using stored content for similar topic: {topic} -> {key} ({score:.2f})")
+    return {"success": True, "source": "cache (similar)", **cached}
+
+
+async def generate_once(topic: str, key: str, user_api_key: str = None, skip_cache: bool = False) -> dict:
+    """Generate a topic once across workers - waits on another worker's lease if held
+
+    skip_cache regenerates even if the topic is already stored (pregenerate --force);
+    a result another worker finishes while we wait on its lease is still used.
+    """
+    while not await asyncio.to_thread(acquire_lease, key, WORKER_ID, LEASE_TTL):
+        report_progress("waiting for another worker generating this topic")
+        await asyncio.sleep(LEASE_POLL_INTERVAL)
+        cached = await asyncio.to_thread(get_cached_content, topic)
+        if cached:
+            print(f"[CACHE] Another worker generated: {topic}")
+            return {"success": True, "source": "cache", **cached}
+    
+    try:
+        # The lease holder may have finished between our cache miss and the lease
+        cached = not skip_cache and await asyncio.to_thread(get_cached_content, topic)
+        if cached:
+            return {"success": True, "source": "cache", **cached}
+        
+        try:
+            async with admission.slot():
+                if GENERATION_MODE == "pipeline":
+                    result = await generate_pipeline(topic, user_api_key)
+                else:
+                    # Try AI generation with multiple models
+                    result = await generate_with_fallback(topic, user_api_key)
+        except AdmissionRejected as e:
+            return busy_response(e)
+        # Don't keep canned fallback stages around - the next request should try again
+        if result.get("success") and not result.get("fallback_stages"):
+            await store_content(topic, result)
+        return result
+    finally:
+        await asyncio.to_thread(release_lease, key, WORKER_ID)
 
 
-def generate_with_fallback(topic: str, user_api_key: str = None) -> dict:
-    """Try multiple models, fall back if one fails"""
+async def stream_all_content(topic: str, user_api_key: str = None):
+    """Stream learning content as events - the story is yielded as soon as the model finishes it
+    
+    Yields {"event": "story", "story", "source", "content_ref"?}, then {"event": "content", ...full content}
+    or {"event": "error", "message"}. In lazy mode "content" only carries the story.
+    """
+    if GENERATION_MODE == "lazy":
+        content = await generate_story_content(topic, user_api_key)
+        if content.get("error"):
+            yield {"event": "error", "message": content["message"]}
+            return
+        yield {"event": "story", "story": content["story"], "source": content["source"], "content_ref": content.get("content_ref")}
+        yield {"event": "content", **content}
+        return
+    
+    ready = await get_ready_content(topic)
+    if not ready:
+        # Someone is already generating this topic - share their result
+        task = joinable_generation(topic, user_api_key)
+        if task:
+            print(f"[AI] Joining in-flight generation for: {topic}")
+            report_progress("joining an identical generation already in progress")
+            ready = await asyncio.shield(task)
+            if ready.get("error"):
+                yield {"event": "error", "message": ready["message"]}
+                return
+    if ready:
+        yield {"event": "story", "story": ready["story"], "source": ready["source"], "content_ref": ready.get("content_ref")}
+        yield {"event": "content", **ready}
+        return
+    
+    api_client = get_client(user_api_key)
+    if not api_client:
+        yield {
+            "event": "error",
+            "message": "No API key available. Please enter your OpenRouter API key for custom topics, or try a Featured Quest!"
+        }
+        return
     
-    prompt = f"""Create a complete learning experience about: {topic}
+    try:
+        async with admission.slot():
+            if GENERATION_MODE == "pipeline":
+                updates = stream_pipeline(topic, user_api_key)
+            else:
+                updates = stream_with_fallback(topic, api_client, user_api_key)
+            async for update in updates:
+                yield update
+    except AdmissionRejected as e:
+        yield {"event": "error", **busy_response(e)}
+
+
+async def stream_pipeline(topic: str, user_api_key: str = None):
+    """Pipeline mode for stream_all_content - the story, then the other stages together"""
+    story = await generate_pipeline_story(topic, user_api_key)
+    if not story:
+        yield {"event": "error", "message": "AI generation unavailable. Please try one of our Featured Quests instead! 🎮"}
+        return
+    yield {"event": "story", "story": story, "source": "ai (pipeline)"}
+    content = await generate_pipeline_stages(topic, story, user_api_key)
+    if not content.get("fallback_stages"):
+        await store_content(topic, content)
+    yield {"event": "content", **content}
+
+
+async def stream_with_fallback(topic: str, api_client: AsyncOpenAI, user_api_key: str = None):
+    """Unified mode for stream_all_content - stream each model in turn until one parses"""
+    prompt = build_prompt(topic)
+    story = None
+    for i, model in enumerate(router.ordered_models()):
+        if not await rate_limiter.acquire(model, api_client.api_key):
+            continue
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            print(f"[AI] Streaming model {i+1}/{len(MODELS)}: {model}")
+            report_progress(f"trying model {i+1}/{len(MODELS)}")
+            stream = await api_client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=3000,
+                stream=True
+            )
+            
+            parser = SectionStreamParser()
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                for name, section in parser.feed(chunk.choices[0].delta.content):
+                    if name == "story" and story is None:
+                        story = build_story(section, topic)
+                        if story:
+                            yield {"event": "story", "story": story, "source": "ai"}
+            
+            report_progress("parsing")
+            result = await asyncio.to_thread(parse_ai_response, parser.text, topic)
+            outcome = "ok" if result else "parse_error"
+            if not result and story is None:
+                continue
+            
+            if result:
+                print(f"[AI] Success with model: {model}")
+            if story is None:
+                yield {"event": "story", "story": result["story"], "source": "ai"}
+            elif result:
+                # A fallback model may have written a different story - keep the one being read
+                result["story"] = story
+            else:
+                # The rest of the output is unusable, but the story is already being read
+                result = {"success": True, "source": "ai", "story": story}
+            result["model"] = model
+            result = await salvage(topic, result, user_api_key)
+            if not result.get("fallback_stages"):
+                await store_content(topic, result)
+            yield {"event": "content", **result}
+            return
+            
+        except (httpx.TimeoutException, APITimeoutError):
+            print(f"[AI] Model {model} timed out (60s)")
+            outcome = "timeout"
+        except RateLimitError as e:
+            print(f"[AI] Model {model} rate limited")
+            rate_limiter.block(model, api_client.api_key, retry_after_seconds(e))
+        except Exception as e:
+            print(f"[AI] Model {model} failed: {type(e).__name__}: {e}")
+        finally:
+            router.record(model, outcome, time.perf_counter() - started)
+    
+    print(f"[AI] All models failed for: {topic}")
+    yield {
+        "event": "error",
+        "message": "AI generation unavailable. Please try one of our Featured Quests instead! 🎮"
+    }
+
+
+def build_prompt(topic: str) -> str:
+    """Prompt asking for story, quiz, master and detective content in one JSON object"""
+    return f"""Create a complete learning experience about: {topic}
 
 Generate ALL of the following in ONE JSON response:
 
@@ -101,6 +389,12 @@ Return ONLY valid JSON in this exact format:
   }}
 }}"""
 
+
+async def generate_with_fallback(topic: str, user_api_key: str = None) -> dict:
+    """Try multiple models, fall back if one fails (never blocks the event loop)"""
+    
+    prompt = build_prompt(topic)
+
     # Get client with user or server API key
     api_client = get_client(user_api_key)
     if not api_client:
@@ -109,36 +403,16 @@ Return ONLY valid JSON in this exact format:
             "message": "No API key available. Please enter your OpenRouter API key for custom topics, or try a Featured Quest!"
         }
 
-    for i, model in enumerate(MODELS):
-        try:
-            print(f"[AI] Trying model {i+1}/{len(MODELS)}: {model}")
-            
-            response = api_client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=3000
-            )
-            
-            if not response or not response.choices:
-                print(f"[AI] Model {model} returned empty response")
-                continue
-            
-            text = response.choices[0].message.content
-            if not text:
-                continue
-            
-            # Parse the response
-            result = parse_ai_response(text, topic)
-            if result:
-                print(f"[AI] Success with model: {model}")
-                return result
-                
-        except httpx.TimeoutException:
-            print(f"[AI] Model {model} timed out (60s)")
-            continue
-        except Exception as e:
-            print(f"[AI] Model {model} failed: {type(e).__name__}: {e}")
-            continue
+    if HEDGE_MODE == "race":
+        hedge_delay = 0
+    elif HEDGE_MODE == "hedge":
+        hedge_delay = HEDGE_DELAY
+    else:
+        hedge_delay = None  # serial
+
+    result = await run_hedged(api_client, prompt, topic, hedge_delay)
+    if result:
+        return await salvage(topic, result, user_api_key)
     
     # All models failed, return friendly error
     print(f"[AI] All models failed for: {topic}")
@@ -148,122 +422,138 @@ Return ONLY valid JSON in this exact format:
     }
 
 
-
-def parse_ai_response(text: str, topic: str) -> dict | None:
-    """Parse AI response into structured content"""
+async def try_model(api_client: AsyncOpenAI, index: int, model: str, prompt: str, topic: str) -> dict | None:
+    """Run one model attempt - returns parsed content or None if the model failed"""
+    # Only waits when this model's shared budget is used up; time spent here isn't the model's latency
+    if not await rate_limiter.acquire(model, api_client.api_key):
+        return None
+    
+    started = time.perf_counter()
+    outcome = "error"
     try:
-        text = text.strip()
-        
-        # Remove markdown code blocks
-        if "```" in text:
-            text = re.sub(r'```json?\s*', '', text)
-            text = re.sub(r'```', '', text)
-        
-        # Extract JSON with improved regex to handle multiple braces or extra text
-        # Finds the first '{' and the last '}'
-        start_idx = text.find('{')
-        end_idx = text.rfind('}')
-        
-        if start_idx != -1 and end_idx != -1:
-            text = text[start_idx:end_idx+1]
-
-        try:
-            data = json.loads(text)
-        except json.JSONDecodeError:
-            # Fallback: try to clean common issues like trailing commas
-            text = re.sub(r',\s*}', '}', text)
-            text = re.sub(r',\s*]', ']', text)
-            data = json.loads(text)
+        print(f"[AI] Trying model {index+1}/{len(MODELS)}: {model}")
+        report_progress(f"trying model {index+1}/{len(MODELS)}")
         
-        # Parse Story
-        story_data = data.get("story", {})
-        story = Story(
-            topic=topic,
-            title=story_data.get("title", f"Learning About {topic}"),
-            content=story_data.get("content", f"An amazing journey into {topic}..."),
-            key_facts=story_data.get("key_facts", [f"{topic} is fascinating"])[:5],
-            xp_reward=15
+        response = await api_client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=3000
         )
         
-        # Parse Quiz
-        quiz_data = data.get("quiz", {})
-        quiz_questions = []
-        for q in quiz_data.get("questions", [])[:5]:
-            quiz_questions.append(QuizQuestion(
-                question=q.get("question", "Question"),
-                options=q.get("options", ["A", "B", "C", "D"]),
-                correct_index=q.get("correct_index", 0),
-                explanation=q.get("explanation", "Correct!")
-            ))
-        
-        if not quiz_questions:
-            return None  # Invalid response, try next model
-        
-        quiz = Quiz(
-            topic=topic,
-            questions=quiz_questions,
-            difficulty="basic",
-            total_xp=len(quiz_questions) * 10 + 20
-        )
-        
-        # Parse Master
-        master_data = data.get("master", {})
-        master_questions = []
-        for q in master_data.get("questions", [])[:3]:
-            master_questions.append(MasterQuestion(
-                question=q.get("question", "Advanced question"),
-                question_type="multiple_choice",
-                options=q.get("options", ["A", "B", "C", "D"]),
-                correct_answer=q.get("correct_answer", "A"),
-                explanation=q.get("explanation", "Correct!"),
-                xp_reward=20
-            ))
-        
-        if not master_questions:
+        if not response or not response.choices:
+            print(f"[AI] Model {model} returned empty response")
+            outcome = "parse_error"
             return None
         
-        master = MasterPractice(
-            topic=topic,
-            questions=master_questions,
-            total_xp=len(master_questions) * 20 + 50
-        )
-        
-        # Parse Detective
-        det_data = data.get("detective", {})
-        clues = [Clue(id=c.get("id", i+1), description=c.get("description", "Clue"), is_key_clue=True) 
-                 for i, c in enumerate(det_data.get("clues", [])[:4])]
-        
-        if not clues:
+        text = response.choices[0].message.content
+        if not text:
+            outcome = "parse_error"
             return None
         
-        options = det_data.get("options", [])
-        question = det_data.get("question", "Solve the mystery")
-        if options:
-            question += "\n\n" + "\n".join([f"{chr(65+i)}. {opt}" for i, opt in enumerate(options[:4])])
-        
-        detective = DetectiveCase(
-            topic=topic,
-            case_title=det_data.get("case_title", f"The {topic} Mystery"),
-            scenario=det_data.get("scenario", f"A mystery about {topic} awaits..."),
-            clues=clues,
-            question=question,
-            correct_answer=det_data.get("correct_answer", "A"),
-            explanation=det_data.get("explanation", "Great detective work!"),
-            xp_reward=100
-        )
-        
-        return {
-            "success": True,
-            "source": "ai",
-            "story": story,
-            "quiz": quiz,
-            "master": master,
-            "detective": detective
-        }
+        # Parse the response off the event loop (CPU-bound regex + JSON work)
+        report_progress("parsing")
+        result = await asyncio.to_thread(parse_ai_response, text, topic)
+        if result:
+            print(f"[AI] Success with model: {model}")
+            outcome = "ok"
+            result["model"] = model
+            result["usage"] = response.usage.model_dump() if response.usage else None
+        else:
+            outcome = "parse_error"
+        return result
         
+    except (httpx.TimeoutException, APITimeoutError):
+        print(f"[AI] Model {model} timed out (60s)")
+        outcome = "timeout"
+    except asyncio.CancelledError:
+        # Hedging losers are cancelled, which says nothing about the model's health
+        outcome = None
+        raise
+    except RateLimitError as e:
+        print(f"[AI] Model {model} rate limited")
+        rate_limiter.block(model, api_client.api_key, retry_after_seconds(e))
     except Exception as e:
-        print(f"[PARSE] Error: {type(e).__name__}: {e}")
+        print(f"[AI] Model {model} failed: {type(e).__name__}: {e}")
+    finally:
+        if outcome:
+            router.record(model, outcome, time.perf_counter() - started)
+    return None
+
+
+async def run_hedged(api_client: AsyncOpenAI, prompt: str, topic: str, hedge_delay: float | None) -> dict | None:
+    """Walk the router's model order, launching the next model when one fails or hedge_delay passes without an answer.
+    
+    hedge_delay=None is plain serial fallback, 0 races every model at once.
+    The first response that passes parse_ai_response wins and the losers are cancelled.
+    """
+    queue = list(enumerate(router.ordered_models()))
+    pending = set()
+    
+    def launch_next():
+        index, model = queue.pop(0)
+        pending.add(asyncio.create_task(try_model(api_client, index, model, prompt, topic)))
+    
+    launch_next()
+    while queue and hedge_delay == 0:
+        launch_next()
+    
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=hedge_delay if queue else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            
+            if not done:
+                # Hedge delay elapsed with no answer - start the next model alongside
+                print(f"[AI] No answer after {hedge_delay}s, hedging with next model")
+                report_progress(f"no answer after {hedge_delay:g}s, also trying the next model")
+                launch_next()
+                continue
+            
+            for task in done:
+                pending.discard(task)
+                result = task.result()
+                if result:
+                    return result
+                # A model failed outright - don't wait out the hedge delay
+                if queue:
+                    launch_next()
         return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+
+def parse_ai_response(text: str, topic: str) -> dict | None:
+    """Parse AI response into structured content - stages that failed to parse are None"""
+    content = parse_quest(text, topic)
+    if not content:
+        return None  # No usable story, try next model
+    return {"success": True, "source": "ai", **content}
+
+
+async def salvage(topic: str, result: dict, user_api_key: str = None) -> dict:
+    """Keep a response's valid stages and regenerate only the missing ones with their own small prompts"""
+    missing = missing_stages(result)
+    if not missing:
+        return result
+    print(f"[AI] Keeping {result.get('model')} story, regenerating: {', '.join(missing)}")
+    report_progress(f"regenerating {', '.join(missing)}")
+    result = await complete_stages(topic, result, user_api_key)
+    result["repaired_stages"] = missing
+    return result
+
+
+def busy_response(error: AdmissionRejected) -> dict:
+    """Error for a generation turned away by admission control - routes answer it with a 429"""
+    return {
+        "error": True,
+        "retry_after": error.retry_after,
+        "message": "Lots of adventures are being generated right now. Please try again in a moment, or try a Featured Quest!"
+    }
 
 
 def generate_smart_fallback(topic: str) -> dict:
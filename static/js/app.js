@@ -168,49 +168,101 @@ async function startLearning() {
 
     try {
         const userApiKey = getUserApiKey();
-        const response = await fetch('/api/session/start', {
+        const response = await fetch('/api/session/jobs', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ topic, api_key: userApiKey || undefined })
         });
 
-        const data = await response.json();
-
-        // Check for error response
-        if (data.error || !response.ok) {
+        if (!response.ok) {
+            // 429 when the server's generation queue is full
+            const error = await response.json().catch(() => ({}));
             hideLoading();
-            alert(data.message || 'Unable to generate content. Please try a Featured Quest instead!');
+            alert(error.message || 'Unable to generate content. Please try a Featured Quest instead!');
             return;
         }
 
-        currentSession = {
-            id: data.session_id,
-            topic: data.topic,
-            aiGenerated: data.ai_generated,
-            source: data.source
-        };
+        // Featured and already generated quests come back at once; anything else runs as a
+        // server-side job whose story is shown as soon as it's ready while quiz, master and
+        // detective keep generating
+        const job = await response.json();
+        if (job.result) {
+            showStory(job.result);
+            return;
+        }
+        const data = await followJob(job, message => showLoading(`Generating your adventure... (${message})`));
+        showStory(data);
+    } catch (error) {
+        hideLoading();
+        alert(error.message || 'Unable to generate content. Please try a Featured Quest instead!');
+        console.error(error);
+    }
+}
 
-        // Show session UI
-        document.getElementById('topic-section').style.display = 'none';
-        document.getElementById('session-container').style.display = 'flex';
-        document.getElementById('sidebar-topic').textContent = data.topic;
+function showStory(data) {
+    currentSession = {
+        id: data.session_id,
+        topic: data.topic,
+        aiGenerated: data.ai_generated,
+        source: data.source
+    };
 
-        // Display story
-        document.getElementById('story-title').textContent = data.story.title;
-        document.getElementById('story-content').innerHTML = formatStoryContent(data.story.content);
+    // Show session UI
+    document.getElementById('topic-section').style.display = 'none';
+    document.getElementById('session-container').style.display = 'flex';
+    document.getElementById('sidebar-topic').textContent = data.topic;
 
-        // Activate story step and update level display
-        activateStep('story');
-        updateSidebarLevels(currentLevel);
+    // Display story
+    document.getElementById('story-title').textContent = data.story.title;
+    document.getElementById('story-content').innerHTML = formatStoryContent(data.story.content);
 
-        hideLoading();
+    // Activate story step and update level display
+    activateStep('story');
+    updateSidebarLevels(currentLevel);
 
-        // Log content source
-        console.log(`✅ Content loaded (source: ${data.source})`);
-    } catch (error) {
-        hideLoading();
-        alert('Error starting session. Please try a Featured Quest!');
-        console.error(error);
+    hideLoading();
+
+    // Log content source
+    console.log(`✅ Story loaded (source: ${data.source})`);
+}
+
+// Follow a generation job's progress events until its result is ready (polling if the stream drops)
+function followJob(job, onProgress) {
+    return new Promise((resolve, reject) => {
+        let settled = false;
+        const settle = (callback, value) => {
+            if (settled) return;
+            settled = true;
+            source.close();
+            callback(value);
+        };
+
+        const source = new EventSource(job.events_url);
+        source.addEventListener('queued', e => onProgress(`waiting in line, #${JSON.parse(e.data).position}`));
+        source.addEventListener('progress', e => onProgress(JSON.parse(e.data).message));
+        source.addEventListener('result', e => settle(resolve, JSON.parse(e.data)));
+        source.addEventListener('done', e => settle(resolve, JSON.parse(e.data)));
+        source.addEventListener('failed', e => settle(reject, new Error(JSON.parse(e.data).message)));
+        source.onerror = () => {
+            if (settled) return;
+            console.warn('Job event stream dropped, polling instead');
+            source.close();
+            pollJob(job, onProgress).then(data => settle(resolve, data), error => settle(reject, error));
+        };
+    });
+}
+
+// Poll a generation job's status once a second until its result is ready
+async function pollJob(job, onProgress) {
+    while (true) {
+        const response = await fetch(job.status_url);
+        if (!response.ok) throw new Error('Generation was interrupted. Please try again!');
+
+        const status = await response.json();
+        if (status.result) return status.result;
+        if (status.status === 'failed') throw new Error(status.message);
+        if (status.progress) onProgress(status.progress);
+        await new Promise(resolve => setTimeout(resolve, 1000));
     }
 }
 
@@ -721,21 +773,30 @@ async function startNextLevel() {
     showLoading(`Loading Level ${currentLevel}...`);
 
     try {
-        // Start new session at next level
-        const response = await fetch('/api/session/start', {
+        // Start new session at next level - a job like startLearning(), so the request
+        // returns at once even while the level is still generating
+        const response = await fetch('/api/session/jobs', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ topic: `${baseTopic} (Level ${currentLevel} - Advanced)` })
+            body: JSON.stringify({
+                topic: `${baseTopic} (Level ${currentLevel} - Advanced)`,
+                api_key: getUserApiKey() || undefined
+            })
         });
 
-        const data = await response.json();
-
-        if (data.error || !response.ok) {
+        if (!response.ok) {
+            // 429 when the server's generation queue is full
+            const error = await response.json().catch(() => ({}));
             hideLoading();
-            alert(data.message || 'Unable to load next level. Try again!');
+            alert(error.message || 'Unable to load next level. Try again!');
             return;
         }
 
+        // Already generated (speculatively, or stored) levels come back at once
+        const job = await response.json();
+        const data = job.result ||
+            await followJob(job, message => showLoading(`Loading Level ${currentLevel}... (${message})`));
+
         currentSession = {
             id: data.session_id,
             topic: baseTopic,
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from modules.admission import AdmissionController, AdmissionRejected, admission
+
+async def generate(controller, client, served, release):
+    async with controller.slot(client):
+        served.append(client)
+        await release.wait()
+
+def test_queued_clients_are_served_round_robin():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queued=10, max_per_client=10)
+        served = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(generate(controller, client, served, release))
+                 for client in ["first", "burst", "burst", "burst", "other"]]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return served
+
+    assert asyncio.run(scenario()) == ["first", "burst", "other", "burst", "burst"]
+
+def test_full_queue_is_rejected():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queued=2, max_per_client=2)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(generate(controller, client, [], release)) for client in ["a", "b", "c"]]
+        await asyncio.sleep(0)
+        assert controller.would_reject("d")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("d")
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected.value.retry_after
+
+    assert asyncio.run(scenario()) >= 1
+
+def test_per_client_limit_leaves_room_for_others():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queued=10, max_per_client=2)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(generate(controller, "burst", [], release)) for _ in range(3)]
+        await asyncio.sleep(0)
+        rejected = controller.would_reject("burst"), controller.would_reject("other")
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected
+
+    assert asyncio.run(scenario()) == (True, False)
+
+def test_full_queue_gets_a_429(monkeypatch):
+    import main
+    monkeypatch.setattr(admission, "active", admission.max_active)
+    monkeypatch.setattr(admission, "queued", admission.max_queued)
+    response = TestClient(main.app).post("/api/session/jobs", json={"topic": "The history of zorbly widgets"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
@@ -0,0 +1,60 @@
+import json
+import pytest
+from modules.quest_parser import extract_json, build_quiz, build_master, build_detective
+
+def test_object_inside_fences_and_prose_braces():
+    text = 'Sure! I filled in every {section}:\n```json\n{"title": "Atoms", "facts": [1, 2]}\n```\nEach {stage} follows.'
+    assert extract_json(text) == {"title": "Atoms", "facts": [1, 2]}
+
+def test_trailing_commas():
+    assert extract_json('{"facts": ["a", "b",], "title": "Atoms",\n}') == {"facts": ["a", "b"], "title": "Atoms"}
+
+def test_raw_newlines_and_tabs_in_strings():
+    assert extract_json('{"content": "Line one\nLine\ttwo"}') == {"content": "Line one\nLine\ttwo"}
+
+def test_unescaped_quotes_in_strings():
+    text = '{"content": "Known as the "powerhouse" of the cell", "title": "Mitochondria"}'
+    assert extract_json(text) == {"content": 'Known as the "powerhouse" of the cell', "title": "Mitochondria"}
+
+def test_curly_quotes_as_delimiters():
+    assert extract_json('{“title”: “Atoms”, "level": 1}') == {"title": "Atoms", "level": 1}
+
+def test_python_literals():
+    text = '{"is_key_clue": True, "hint": None, "solved": False, "note": "True story"}'
+    assert extract_json(text) == {"is_key_clue": True, "hint": None, "solved": False, "note": "True story"}
+
+def test_truncated_output_is_not_recovered():
+    with pytest.raises(json.JSONDecodeError):
+        extract_json('{"story": {"title": "Atoms", "content": "Everything is made of')
+
+def quiz_of(*indexes):
+    return build_quiz({"questions": [
+        {"question": f"Q{i}?", "options": ["A", "B", "C", "D"], "correct_index": index} for i, index in enumerate(indexes)
+    ]}, "Topic")
+
+def test_one_based_indexes_are_shifted_together():
+    quiz = quiz_of(1, 4, 2)
+    assert [q.correct_index for q in quiz.questions] == [0, 3, 1]
+
+def test_zero_based_indexes_without_a_zero_stay_put():
+    quiz = quiz_of(1, 3, 2)
+    assert [q.correct_index for q in quiz.questions] == [1, 3, 2]
+
+def test_out_of_range_index_in_a_zero_based_set_is_dropped():
+    quiz = quiz_of(0, 4, 2)
+    assert [q.correct_index for q in quiz.questions] == [0, 2]
+
+def test_one_based_master_answers():
+    master = build_master({"questions": [
+        {"question": "Q?", "options": ["Red", "Blue", "Green"], "correct_answer": 3},
+        {"question": "R?", "options": ["Up", "Down"], "correct_answer": "1"},
+    ]}, "Topic")
+    assert [q.correct_answer for q in master.questions] == ["Green", "Up"]
+
+def test_one_based_detective_answer():
+    case = build_detective({
+        "clues": [{"description": "A footprint"}],
+        "options": ["The butler", "The cook", "The gardener"],
+        "correct_answer": 3,
+    }, "Topic")
+    assert case.correct_answer == "C. The gardener"
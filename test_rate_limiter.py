@@ -0,0 +1,46 @@
+import uuid
+import pytest
+from gamification.database import SessionLocal
+from gamification.models_db import RateLimitBucket
+from modules import rate_limiter as rate_limiter_module
+from modules.rate_limiter import RateLimiter
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def key():
+    key = f"test-model|{uuid.uuid4().hex}"
+    yield key
+    db = SessionLocal()
+    db.query(RateLimitBucket).filter(RateLimitBucket.bucket_key == key).delete()
+    db.commit()
+    db.close()
+
+def workers(monkeypatch, rpm=60, burst=3):
+    """Two limiters sharing one bucket table, like two gunicorn workers, on a clock the test moves"""
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter_module.time, "time", clock.time)
+    return RateLimiter(rpm, burst), RateLimiter(rpm, burst), clock
+
+def test_burst_is_shared_between_workers(monkeypatch, key):
+    first, second, _ = workers(monkeypatch)
+    assert [first.try_take(key), second.try_take(key), first.try_take(key)] == [0, 0, 0]
+    assert second.try_take(key) > 0
+    assert first.try_take(key) > 0
+
+def test_tokens_refill_at_the_rate(monkeypatch, key):
+    first, second, clock = workers(monkeypatch)
+    for limiter in (first, second, first):
+        limiter.try_take(key)
+    assert second.try_take(key) == 1.0  # One token a second at 60 rpm
+    clock.now += 1
+    assert second.try_take(key) == 0
+    assert first.try_take(key) > 0
+    clock.now += 60
+    assert [first.try_take(key), second.try_take(key), first.try_take(key)] == [0, 0, 0]  # Refilled to the burst, no more
+    assert second.try_take(key) > 0
@@ -0,0 +1,42 @@
+import time
+from gamification.timing_wheel import TimingWheel
+
+def wheel_at():
+    wheel = TimingWheel(horizon=60, slots=60)  # One-second ticks
+    return wheel, time.time()
+
+def test_keys_expire_within_a_tick_of_their_deadline():
+    wheel, now = wheel_at()
+    wheel.schedule("soon", now + 5)
+    wheel.schedule("later", now + 30)
+    assert wheel.expire(now + 4.9) == []
+    assert wheel.expire(now + 6) == ["soon"]
+    assert wheel.expire(now + 7) == []
+    assert wheel.expire(now + 31) == ["later"]
+    assert len(wheel) == 0
+
+def test_rescheduled_key_expires_at_its_new_deadline():
+    wheel, now = wheel_at()
+    wheel.schedule("session", now + 5)
+    wheel.schedule("session", now + 20)
+    assert wheel.expire(now + 10) == []
+    assert wheel.expire(now + 21) == ["session"]
+
+def test_cancelled_key_never_expires():
+    wheel, now = wheel_at()
+    wheel.schedule("session", now + 5)
+    wheel.cancel("session")
+    assert wheel.expire(now + 10) == []
+    assert len(wheel) == 0
+
+def test_past_deadline_expires_on_the_next_sweep():
+    wheel, now = wheel_at()
+    wheel.schedule("stale", now - 10)
+    assert wheel.expire(now + 1.5) == ["stale"]
+
+def test_everything_expires_after_an_idle_gap_longer_than_a_revolution():
+    wheel, now = wheel_at()
+    for second in range(1, 60, 7):
+        wheel.schedule(second, now + second)
+    assert sorted(wheel.expire(now + 500)) == list(range(1, 60, 7))
+    assert len(wheel) == 0
@@ -0,0 +1,39 @@
+from gamification.content_store import topic_key
+from modules.topic_index import TopicIndex
+
+def index_of(*topics):
+    index = TopicIndex()
+    for topic in topics:
+        index.add(topic_key(topic))
+    return index
+
+def test_rephrased_topic_matches():
+    match = index_of("How do black holes work?").lookup("black holes explained")
+    assert match and match[0] == topic_key("How do black holes work?")
+
+def test_different_numbers_never_match():
+    assert index_of("World War 2").lookup("World War 1") is None
+    assert index_of("Type 2 diabetes").lookup("Type 1 diabetes") is None
+    assert index_of("World War II").lookup("World War I") is None
+
+def test_different_letters_never_match():
+    assert index_of("Vitamin B").lookup("Vitamin C") is None
+
+def test_same_number_still_matches():
+    match = index_of("World War 2", "World War 1").lookup("world war 2 explained")
+    assert match and match[0] == topic_key("World War 2")
+
+def test_one_different_word_never_matches():
+    assert index_of("Nuclear fusion").lookup("Nuclear fission") is None
+    assert index_of("Organic chemistry").lookup("Inorganic chemistry") is None
+    assert index_of("DNA replication").lookup("RNA replication") is None
+    assert index_of("Hydrogen").lookup("Hydrogen bond") is None
+
+def test_article_letters_after_a_word_count():
+    assert index_of("Vitamin").lookup("Vitamin A") is None
+    assert index_of("Hepatitis").lookup("Hepatitis A") is None
+    assert index_of("World War").lookup("World War I") is None
+
+def test_article_letters_in_a_question_are_ignored():
+    match = index_of("Black holes").lookup("What is a black hole")
+    assert match and match[0] == topic_key("Black holes")